@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import City, Neighborhood, Activity, ActivityJoin
+from .models import City, Neighborhood, Activity, ActivityJoin, ArchivedActivity
 
 
 @admin.register(City)
@@ -11,7 +11,8 @@ class CityAdmin(admin.ModelAdmin):
 
 @admin.register(Neighborhood)
 class NeighborhoodAdmin(admin.ModelAdmin):
-    list_display = ["name", "city", "slug"]
+    list_display = ["name", "city", "slug", "latitude", "longitude"]
+    list_select_related = ["city"]
     list_filter = ["city"]
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ["name", "city__name"]
@@ -20,6 +21,7 @@ class NeighborhoodAdmin(admin.ModelAdmin):
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
     list_display = ["title", "neighborhood", "starts_at", "status", "helpers_joined", "helpers_needed"]
+    list_select_related = ["neighborhood__city"]
     list_filter = ["status", "neighborhood__city", "starts_at"]
     search_fields = ["title", "description", "location_hint"]
     readonly_fields = ["secret_token", "created_at", "updated_at"]
@@ -29,4 +31,20 @@ class ActivityAdmin(admin.ModelAdmin):
 @admin.register(ActivityJoin)
 class ActivityJoinAdmin(admin.ModelAdmin):
     list_display = ["activity", "session_key", "joined_at"]
+    list_select_related = ["activity"]
     list_filter = ["joined_at"]
+
+
+@admin.register(ArchivedActivity)
+class ArchivedActivityAdmin(admin.ModelAdmin):
+    list_display = ["title", "neighborhood", "starts_at", "status", "archived_at"]
+    list_select_related = ["neighborhood__city"]
+    list_filter = ["status", "neighborhood__city"]
+    search_fields = ["title", "description", "location_hint"]
+    date_hierarchy = "starts_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
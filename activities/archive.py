@@ -0,0 +1,84 @@
+"""
+Archival of old activities.
+
+Activities that ended more than ``ARCHIVE_AFTER_DAYS`` ago are moved, with
+their joins, into ``ArchivedActivity`` / ``ArchivedJoin`` in bounded batches,
+one transaction per batch. That keeps the hot ``Activity`` table and its
+indexes sized to live data. Archived rows keep their primary key and secret
+token, and ``get_activity_or_404`` falls back to the archive, so detail and
+manage links keep working.
+
+Each batch locks its rows (``select_for_update(skip_locked=True)``) before
+copying them. A join or manage-form save that already holds an activity's
+row is skipped until a later batch; one that comes after the lock waits,
+then finds the row gone, so no join or edit is lost between the copy and
+the delete.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.utils import timezone
+
+from . import listings
+from .models import Activity, ActivityJoin, ArchivedActivity, ArchivedJoin
+
+ACTIVITY_FIELDS = [
+    f.attname for f in ArchivedActivity._meta.concrete_fields if f.name != "archived_at"
+]
+
+
+def cutoff(now=None):
+    return (now or timezone.now()) - timezone.timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archive_batch(before, batch_size=500):
+    """Move up to batch_size activities that ended before `before`; return how many moved."""
+    with transaction.atomic():
+        ids = list(
+            Activity.objects.filter(ends_at__lt=before)
+            .order_by("ends_at")
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        ArchivedActivity.objects.bulk_create([
+            ArchivedActivity(**row)
+            for row in Activity.objects.filter(pk__in=ids).values(*ACTIVITY_FIELDS)
+        ])
+        ArchivedJoin.objects.bulk_create([
+            ArchivedJoin(**row)
+            for row in ActivityJoin.objects.filter(activity_id__in=ids).values(
+                "activity_id", "session_key", "joined_at"
+            )
+        ])
+        ActivityJoin.objects.filter(activity_id__in=ids).delete()
+        listings.remove(ids)
+        # Skip Activity's post_delete handlers: these rows ended long ago, so
+        # they are in no rollup window or cached page.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(Activity._meta.db_table)} "
+                f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+    return len(ids)
+
+
+def get_activity_or_404(*related, **lookup):
+    """Find an activity in the hot table, falling back to the archive."""
+    activity = Activity.objects.select_related(*related).filter(**lookup).first()
+    if activity is None:
+        activity = get_object_or_404(ArchivedActivity.objects.select_related(*related), **lookup)
+    return activity
+
+
+async def aget_activity_or_404(*related, **lookup):
+    activity = await Activity.objects.select_related(*related).filter(**lookup).afirst()
+    if activity is None:
+        activity = await aget_object_or_404(
+            ArchivedActivity.objects.select_related(*related), **lookup
+        )
+    return activity
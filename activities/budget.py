@@ -0,0 +1,148 @@
+"""
+Per-view query budgets.
+
+``QueryBudgetMiddleware`` counts the queries and database time of every
+request. A view declares its budget with ``@query_budget(n)``. The
+``QUERY_BUDGETS`` setting can override a budget by URL name. When a request
+goes over budget the middleware logs a warning, or raises
+``QueryBudgetExceeded`` when ``QUERY_BUDGET_MODE`` is ``"raise"`` (the
+test suite runs that way, so new N+1 queries fail the tests).
+
+Under ASGI the queries run in the request's ``sync_to_async`` thread rather
+than on the event loop, so the async path installs the wrapper there.
+
+A streaming response (the JSON feeds, the SSE streams) runs most of its
+queries after the view returns, so for those the count continues through the
+response's iterator and the budget is checked as each chunk is produced.
+"""
+
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """execute_wrapper that tallies query count and time for one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.reported = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def query_budget(max_queries):
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def budget_for(match):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    if match.url_name in budgets:
+        return budgets[match.url_name]
+    return getattr(match.func, "query_budget", None)
+
+
+def _add_wrapper(wrapper):
+    """Install wrapper on this thread's connection; return the list to remove it from.
+
+    An abandoned stream is closed from whichever thread finalizes it, whose
+    connection is not the one the wrapper was added to.
+    """
+    wrappers = connection.execute_wrappers
+    wrappers.append(wrapper)
+    return wrappers
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = request.query_stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        self.check(request, stats)
+        return self.count_stream(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = request.query_stats = QueryStats()
+        wrappers = await sync_to_async(_add_wrapper)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrappers.remove(stats)
+        self.check(request, stats)
+        return self.count_stream(request, response, stats)
+
+    def count_stream(self, request, response, stats):
+        if response.streaming:
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = self._acounted(request, content, stats)
+            else:
+                response.streaming_content = self._counted(request, content, stats)
+        return response
+
+    def _counted(self, request, content, stats):
+        with connection.execute_wrapper(stats):
+            for chunk in content:
+                self.check(request, stats)
+                yield chunk
+        self.check(request, stats)
+
+    async def _acounted(self, request, content, stats):
+        wrappers = await sync_to_async(_add_wrapper)(stats)
+        try:
+            async for chunk in content:
+                self.check(request, stats)
+                yield chunk
+        finally:
+            wrappers.remove(stats)
+        self.check(request, stats)
+
+    def check(self, request, stats):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return
+        budget = budget_for(match)
+        if budget is None or stats.count <= budget or stats.reported:
+            return
+        stats.reported = True
+        message = (
+            f"{match.url_name} ran {stats.count} queries "
+            f"({stats.duration * 1000:.1f} ms), budget is {budget}"
+        )
+        if settings.QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message, extra={
+            "url_name": match.url_name,
+            "queries": stats.count,
+            "db_ms": round(stats.duration * 1000, 1),
+            "budget": budget,
+        })
@@ -0,0 +1,68 @@
+"""
+Render cache for activity cards.
+
+A card's HTML depends on the activity row and on the clock (its time label
+and "happening now" highlight), so it is cached under
+``(pk, updated_at, minute bucket)``. Any save bumps ``updated_at`` and a new
+minute starts a new bucket, so stale cards are never read and simply expire.
+A list of cards is fetched with one ``get_many`` and the misses written back
+with one ``set_many``.
+
+``components/activity_card.html`` is rendered only here, so every list of
+cards (the neighborhood page, its ``more/`` fragment and near me) shares
+this cache. The activity detail page and the location search show no
+cards: the detail page is the full activity with the visitor's join state,
+revalidated by its ETag, and search lists cities and neighborhoods.
+"""
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+TEMPLATE = "components/activity_card.html"
+BUCKET_SECONDS = 60
+
+
+def bucket(now=None):
+    return int((now or timezone.now()).timestamp()) // BUCKET_SECONDS
+
+
+def card_key(activity, minute):
+    return f"card:{activity.pk}:{activity.updated_at.timestamp():.6f}:{minute}"
+
+
+def _keys(activities):
+    minute = bucket()
+    return {card_key(activity, minute): activity for activity in activities}
+
+
+def _render_missing(keys, cached):
+    return {
+        key: render_to_string(TEMPLATE, {"activity": activity})
+        for key, activity in keys.items()
+        if key not in cached
+    }
+
+
+def _cards(keys, cached, missing):
+    return [mark_safe(cached.get(key) or missing[key]) for key in keys]
+
+
+def render(activities):
+    """Return the rendered card for each activity, in order."""
+    keys = _keys(activities)
+    cached = cache.get_many(keys)
+    missing = _render_missing(keys, cached)
+    if missing:
+        cache.set_many(missing, BUCKET_SECONDS)
+    return _cards(keys, cached, missing)
+
+
+async def arender(activities):
+    keys = _keys(activities)
+    cached = await cache.aget_many(keys)
+    missing = _render_missing(keys, cached)
+    if missing:
+        await cache.aset_many(missing, BUCKET_SECONDS)
+    return _cards(keys, cached, missing)
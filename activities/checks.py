@@ -0,0 +1,18 @@
+from django.core.checks import Tags, Warning, register
+
+from . import pagecache
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    if pagecache.shared():
+        return []
+    return [Warning(
+        "The default cache is per-process.",
+        hint=(
+            "Set CACHE_URL to a Redis or Memcached server. Otherwise page and "
+            "search purges, rate limits and single-flight locks only apply "
+            "within the process that makes them."
+        ),
+        id="activities.W001",
+    )]
@@ -0,0 +1,154 @@
+"""
+Cheap ETag / Last-Modified validators for the read-heavy pages.
+
+Each function runs a small indexed query instead of building the page's
+querysets and template, so a returning client gets a 304 quickly. The time
+labels on the pages ("Happening now", "Today at ...") depend on the clock as
+well as the data, so the validators include the current local date (labels
+roll over at midnight in ``TIME_ZONE``) and which activities have started.
+City and neighborhood validators also include the names the page shows, so
+a rename or geography import changes them.
+"""
+
+import hashlib
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import ledger, rollups
+from .models import Activity, ActivityCount, ActivityListing, City, Neighborhood
+
+
+@lru_cache(maxsize=None)
+def _templates_digest():
+    """Fingerprint the templates so a deploy that changes markup changes every ETag."""
+    digest = hashlib.md5()
+    for directory in settings.TEMPLATES[0]["DIRS"]:
+        for path in sorted(directory.rglob("*.html")):
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:8]
+
+
+def _etag(*parts):
+    raw = ":".join(str(part) for part in (_templates_digest(), *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+class _Proceed(HttpResponse):
+    pass
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    """``condition()`` for async views, with the validators run in a thread.
+
+    Django's decorator accepts async views but calls the validator functions
+    on the event loop, where they cannot query the database.
+    """
+    def decorator(view):
+        @sync_to_async
+        @condition(etag_func=etag_func, last_modified_func=last_modified_func)
+        def check(request, *args, **kwargs):
+            return _Proceed()
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            checked = await check(request, *args, **kwargs)
+            if not isinstance(checked, _Proceed):
+                return checked
+            response = await view(request, *args, **kwargs)
+            for header in ("ETag", "Last-Modified"):
+                if header in checked.headers:
+                    response.headers.setdefault(header, checked.headers[header])
+            return response
+
+        return inner
+
+    return decorator
+
+
+def _activity_row(request, pk):
+    # condition() calls both validators; share one lookup between them.
+    if not hasattr(request, "_activity_row"):
+        request._activity_row = (
+            Activity.objects.filter(pk=pk)
+            .values_list("updated_at", "starts_at", "ends_at")
+            .first()
+        )
+    return request._activity_row
+
+
+def activity_etag(request, pk):
+    row = _activity_row(request, pk)
+    if row is None:
+        return None
+    updated_at, starts_at, ends_at = row
+    now = timezone.now()
+    return _etag(
+        pk, updated_at.isoformat(), timezone.localdate(now), starts_at <= now, ends_at <= now,
+        ledger.has_joined(request, pk),
+    )
+
+
+def activity_last_modified(request, pk):
+    row = _activity_row(request, pk)
+    if row is None:
+        return None
+    now = timezone.now()
+    midnight = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(instant for instant in (*row, midnight) if instant <= now)
+
+
+def neighborhood_etag(request, city_slug, neighborhood_slug):
+    place = (
+        Neighborhood.objects.filter(slug=neighborhood_slug, city__slug=city_slug)
+        .values_list("pk", "name", "city__name", "city__state")
+        .first()
+    )
+    if place is None:
+        return None
+    neighborhood_id = place[0]
+    time_filter = request.GET.get("filter", "today")
+    now = timezone.now()
+    stats = (
+        ActivityListing.objects.filter(neighborhood_id=neighborhood_id)
+        .in_window(Activity.Window.from_filter(time_filter), now)
+        .aggregate(
+            latest=Max("updated_at"),
+            total=Count("pk"),
+            started=Count("pk", filter=Q(starts_at__lte=now)),
+        )
+    )
+    return _etag(
+        *place, time_filter, timezone.localdate(now),
+        stats["latest"], stats["total"], stats["started"],
+    )
+
+
+def city_etag(request, city_slug):
+    place = City.objects.filter(slug=city_slug).values_list("pk", "name", "state").first()
+    if place is None:
+        return None
+    city_id = place[0]
+    time_filter = request.GET.get("filter", "today")
+    rows = rollups.current(
+        ActivityCount.objects.filter(
+            city_id=city_id,
+            window=Activity.Window.from_filter(time_filter),
+            neighborhood__isnull=False,
+        )
+        .select_related("neighborhood")
+        .order_by("neighborhood_id"),
+        timezone.now(),
+    )
+    return _etag(
+        *place, time_filter,
+        *(
+            (row.neighborhood_id, row.neighborhood.name, row.count, row.expires_at)
+            for row in rows if row.count
+        ),
+    )
@@ -0,0 +1,73 @@
+"""
+PostgreSQL connection pool metrics.
+
+With psycopg 3 installed, settings give each worker process a
+``psycopg_pool`` pool (Django's ``OPTIONS["pool"]``) sized to the requests
+the worker can run at once, and health-check each connection on checkout.
+With psycopg2 the app falls back to persistent connections.
+
+``stats`` reads this process's pool: its size against ``min_size`` and
+``max_size``, connections in use, ``overflow`` (connections opened beyond
+``min_size``), requests waiting now, and how many checkouts had to queue and
+for how long. Each worker logs them on the ``activities.dbpool`` logger at
+most every ``DB_POOL_STATS_INTERVAL`` seconds, with the counters covering
+the interval since its last report; the per-request checkout time is the
+``connect`` phase of ``Server-Timing``.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_reported_at = time.monotonic()
+_report_lock = threading.Lock()
+
+
+def stats(alias="default", reset=False):
+    """Return this process's pool metrics for alias, or None if it is not pooled.
+
+    With reset, the counters start again from zero after this read.
+    """
+    pool = getattr(connections[alias], "pool", None)
+    if pool is None:
+        return None
+    raw = pool.pop_stats() if reset else pool.get_stats()
+    size = raw.get("pool_size", 0)
+    min_size = raw.get("pool_min", 0)
+    queued = raw.get("requests_queued", 0)
+    wait_ms = raw.get("requests_wait_ms", 0)
+    return {
+        "size": size,
+        "min_size": min_size,
+        "max_size": raw.get("pool_max", 0),
+        "in_use": size - raw.get("pool_available", 0),
+        "overflow": max(0, size - min_size),
+        "waiting": raw.get("requests_waiting", 0),
+        "requests": raw.get("requests_num", 0),
+        "queued": queued,
+        "wait_ms": wait_ms,
+        "avg_wait_ms": round(wait_ms / queued, 1) if queued else 0.0,
+        "timeouts": raw.get("requests_errors", 0),
+        "connections_lost": raw.get("connections_lost", 0),
+    }
+
+
+def maybe_report(**kwargs):
+    """Log pool metrics if DB_POOL_STATS_INTERVAL has passed since the last report."""
+    global _reported_at
+    with _report_lock:
+        if time.monotonic() - _reported_at < settings.DB_POOL_STATS_INTERVAL:
+            return
+        _reported_at = time.monotonic()
+    fields = stats(reset=True)
+    if fields is None:
+        return
+    logger.info(
+        "db pool " + " ".join(f"{key}={value}" for key, value in fields.items()),
+        extra={"db_pool": fields},
+    )
@@ -0,0 +1,96 @@
+"""
+Streaming JSON feeds of activities for partner apps and kiosks.
+
+Rows are read as ``.values()`` dicts through ``aiterator(chunk_size=...)``
+and written out a chunk at a time, so a feed of every active activity streams
+in constant memory without building model instances. The generator is
+asynchronous because Django buffers a synchronous iterator in full before
+streaming it under ASGI.
+
+Rows come in ``(updated_at, id)`` order and the response ends with
+``next_since``, the last row's ``updated_at``. Passing that back as
+``?since=`` returns only rows changed after it, whatever their status, so a
+client also learns about cancellations and completions. A row's
+``updated_at`` is stamped before its transaction commits, so ``next_since``
+is held at least ``SINCE_MARGIN`` behind the start of the read: a row
+stamped earlier but committed after a later one was read still comes in
+the next fetch. Rows changed within that margin can come twice, so clients
+dedupe on ``(id, updated_at)``. A full fetch reads
+the ``ActivityListing`` table alone; a ``since`` fetch has to read
+``Activity``, because closed activities have no listing.
+"""
+
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import F, Value
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Activity, ActivityListing
+
+CHUNK_SIZE = 500
+SINCE_MARGIN = timedelta(seconds=30)
+
+FIELDS = [
+    "id", "title", "description", "location_hint", "starts_at", "ends_at",
+    "duration_minutes", "helpers_needed", "helpers_joined", "status", "updated_at",
+]
+LOCATION = {
+    "city_slug": F("neighborhood__city__slug"),
+    "neighborhood_slug": F("neighborhood__slug"),
+}
+LISTING_FIELDS = [
+    *(name for name in FIELDS if name not in ("id", "status")),
+    "city_slug", "neighborhood_slug",
+]
+LISTING_EXPRESSIONS = {"id": F("activity_id"), "status": Value(Activity.Status.ACTIVE)}
+
+
+def parse_since(value):
+    """Return the aware datetime in a `since` parameter, or None if it is malformed."""
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def rows(queryset, since=None):
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    queryset = queryset.order_by("updated_at", "pk")
+    if queryset.model is ActivityListing:
+        return queryset.values(*LISTING_FIELDS, **LISTING_EXPRESSIONS)
+    return queryset.values(*FIELDS, **LOCATION)
+
+
+def _encode(value):
+    return value.isoformat()
+
+
+async def _stream(queryset, since):
+    horizon = timezone.now() - SINCE_MARGIN
+    last = since
+    chunk = []
+    separator = ""
+    yield '{"activities": ['
+    async for row in rows(queryset, since).aiterator(chunk_size=CHUNK_SIZE):
+        chunk.append(json.dumps(row, default=_encode))
+        last = row["updated_at"]
+        if len(chunk) == CHUNK_SIZE:
+            yield separator + ",".join(chunk)
+            chunk, separator = [], ","
+    if chunk:
+        yield separator + ",".join(chunk)
+    if last is not None and last > horizon:
+        last = horizon
+    yield f'], "next_since": {json.dumps(last, default=_encode)}}}\n'
+
+
+def stream(queryset, since=None):
+    """A JSON response streaming the rows of `queryset` changed after `since`."""
+    return StreamingHttpResponse(_stream(queryset, since), content_type="application/json")
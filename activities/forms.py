@@ -72,3 +72,8 @@ class ActivityForm(forms.ModelForm):
             "host_email": "Your email (for updates)",
             "host_phone": "Your phone (optional)",
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Neighborhood.__str__ shows the city name.
+        self.fields["neighborhood"].queryset = Neighborhood.objects.select_related("city")
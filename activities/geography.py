@@ -0,0 +1,307 @@
+"""
+Bulk loading of cities and neighborhoods.
+
+Rows come from CSV or GeoJSON files and are slugified and deduplicated in
+memory, then written in a few set-based statements: ``COPY`` into a temporary
+table followed by ``INSERT ... ON CONFLICT`` on PostgreSQL, and batched
+``bulk_create(update_conflicts=True)`` elsewhere. Cities are upserted on
+``slug`` and neighborhoods on ``(city, slug)``, so re-running an import
+updates names in place instead of duplicating rows.
+
+City slugs are chosen against the cities already stored as well as the rest
+of the file: a (name, state) pair that exists keeps its slug, and a name
+whose plain slug belongs to a city in another state gets a state-qualified
+one ("springfield-illinois"), as does a name whose slug starts another
+page's URL ("near-texas"). An upsert only ever renames a city, never
+moves it to another state. A name with no ASCII letters or digits ("東京")
+needs an explicit ``city_slug`` or ``slug``, since URLs only route ASCII slugs.
+
+After the import commits, only the listings of activities in cities and
+neighborhoods it renamed (or gave a new center) are refreshed.
+
+CSV files need ``city`` and ``state`` columns and may have ``neighborhood``,
+``city_slug``, ``slug``, ``latitude`` and ``longitude`` columns; a row without
+a neighborhood only defines its city. GeoJSON features carry the same keys in
+``properties`` (``name`` is accepted for ``neighborhood``), and a Point or
+Polygon geometry gives the neighborhood's center. Importing a neighborhood
+without coordinates keeps the ones it already has.
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.core.validators import slug_re
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from . import listings, pagecache, rollups, search
+from .models import RESERVED_CITY_SLUGS, City, Neighborhood
+
+SLUG_LENGTH = City._meta.get_field("slug").max_length
+NAME_LENGTH = City._meta.get_field("name").max_length
+
+
+class GeographyError(ValueError):
+    pass
+
+
+@dataclass
+class Geography:
+    cities: dict = field(default_factory=dict)  # slug -> (name, state)
+    neighborhoods: dict = field(default_factory=dict)  # (city slug, slug) -> (name, lat, lng)
+    duplicates: int = 0
+    stored: dict = field(default_factory=dict)  # slug -> (name, state) already in the database
+    _city_keys: dict = field(default_factory=dict)  # (name, state) -> slug
+
+    def __post_init__(self):
+        self._stored_slugs = {key: slug for slug, key in self.stored.items()}
+
+    def add(self, city, state, neighborhood="", city_slug="", slug="", latitude=None, longitude=None):
+        city, state, neighborhood = city.strip(), state.strip(), neighborhood.strip()
+        if not city or not state:
+            raise GeographyError(f"row is missing a city or state: {city!r}, {state!r}")
+        if len(city) > NAME_LENGTH or len(neighborhood) > NAME_LENGTH:
+            raise GeographyError(f"name longer than {NAME_LENGTH} characters: {city or neighborhood!r}")
+
+        city_slug = self._city_slug(city, state, city_slug.strip())
+        if not neighborhood:
+            return
+        latitude, longitude = _coordinates(latitude, longitude)
+        key = (city_slug, _slug(slug.strip() or slugify(neighborhood), neighborhood, "slug"))
+        if key in self.neighborhoods:
+            self.duplicates += 1
+        else:
+            self.neighborhoods[key] = (neighborhood, latitude, longitude)
+
+    def _city_slug(self, name, state, explicit):
+        if (name, state) in self._city_keys:
+            return self._city_keys[(name, state)]
+        slug = explicit or self._stored_slugs.get((name, state)) or slugify(name)
+        slug = _slug(slug, name, "city_slug")
+        if not explicit and self._taken(slug, state):
+            # Same city name in another state: "springfield-illinois".
+            slug = _slug(slugify(f"{name} {state}"), name, "city_slug")
+        if slug in RESERVED_CITY_SLUGS:
+            raise GeographyError(f"city slug {slug!r} is the start of another page's URL")
+        if self._taken(slug, state):
+            used_by = self.cities.get(slug) or self.stored[slug]
+            raise GeographyError(f"city slug {slug!r} is used by {used_by} and {(name, state)}")
+        self._city_keys[(name, state)] = slug
+        self.cities[slug] = (name, state)
+        return slug
+
+    def _taken(self, slug, state):
+        # A stored city with this slug in the same state is the one being renamed.
+        return (
+            slug in RESERVED_CITY_SLUGS
+            or slug in self.cities
+            or (slug in self.stored and self.stored[slug][1] != state)
+        )
+
+
+def _slug(slug, name, column):
+    # URLs only route ASCII slugs, and a name like "東京" or "--" slugifies to "".
+    slug = slug[:SLUG_LENGTH]
+    if not slug_re.match(slug):
+        raise GeographyError(f"no URL slug for {name!r}; give one in a {column} column")
+    return slug
+
+
+def _coordinates(latitude, longitude):
+    if latitude in (None, "") and longitude in (None, ""):
+        return None, None
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise GeographyError(f"invalid coordinates: {latitude!r}, {longitude!r}") from None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise GeographyError(f"coordinates out of range: {latitude}, {longitude}")
+    return latitude, longitude
+
+
+def _center(geometry):
+    """(latitude, longitude) of a Point, or the mean vertex of a (Multi)Polygon's outer ring."""
+    if not geometry:
+        return None, None
+    kind, coords = geometry.get("type"), geometry.get("coordinates")
+    if kind == "MultiPolygon" and coords:
+        kind, coords = "Polygon", coords[0]
+    if kind == "Polygon" and coords:
+        ring = coords[0][:-1] or coords[0]
+        return sum(p[1] for p in ring) / len(ring), sum(p[0] for p in ring) / len(ring)
+    if kind == "Point" and coords:
+        return coords[1], coords[0]
+    return None, None
+
+
+def read_csv(path, geography):
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            try:
+                geography.add(
+                    row.get("city") or "",
+                    row.get("state") or "",
+                    row.get("neighborhood") or "",
+                    row.get("city_slug") or "",
+                    row.get("slug") or "",
+                    row.get("latitude"),
+                    row.get("longitude"),
+                )
+            except GeographyError as error:
+                raise GeographyError(f"{path}:{line}: {error}") from None
+
+
+def read_geojson(path, geography):
+    with open(path, encoding="utf-8") as handle:
+        features = json.load(handle).get("features", [])
+    for index, feature in enumerate(features):
+        props = feature.get("properties") or {}
+        try:
+            geography.add(
+                props.get("city") or "",
+                props.get("state") or "",
+                props.get("neighborhood") or props.get("name") or "",
+                props.get("city_slug") or "",
+                props.get("slug") or "",
+                *_center(feature.get("geometry")),
+            )
+        except GeographyError as error:
+            raise GeographyError(f"{path}: feature {index}: {error}") from None
+
+
+READERS = {".csv": read_csv, ".geojson": read_geojson, ".json": read_geojson}
+
+
+def read(paths):
+    geography = Geography(stored={
+        slug: (name, state) for slug, name, state in City.objects.values_list("slug", "name", "state")
+    })
+    for path in map(Path, paths):
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise GeographyError(f"{path}: expected a .csv, .geojson or .json file")
+        reader(path, geography)
+    return geography
+
+
+def load(geography, batch_size=5000):
+    """Upsert everything in geography; return (cities, neighborhoods) written."""
+    with transaction.atomic():
+        renamed = _renamed(geography)
+        if connection.vendor == "postgresql":
+            _copy_upsert(geography)
+        else:
+            _bulk_upsert(geography, batch_size)
+
+        # Bulk writes skip the signals that keep these in step.
+        transaction.on_commit(search.invalidate_index)
+        transaction.on_commit(lambda: listings.refresh_locations(*renamed))
+        # Neighborhood pages show their city's name too.
+        transaction.on_commit(lambda: pagecache.purge_cities(geography.cities))
+        transaction.on_commit(rollups.invalidate_city_list)
+    return len(geography.cities), len(geography.neighborhoods)
+
+
+def _renamed(geography):
+    """Ids of the stored cities and neighborhoods whose name or center the import changes.
+
+    New rows have no activities yet, so only these need their listings refreshed.
+    """
+    city_ids = [
+        pk for pk, slug, name in City.objects.values_list("pk", "slug", "name")
+        if slug in geography.cities and geography.cities[slug][0] != name
+    ]
+    neighborhood_ids = []
+    for pk, city_slug, slug, *stored in Neighborhood.objects.values_list(
+        "pk", "city__slug", "slug", "name", "latitude", "longitude"
+    ):
+        imported = geography.neighborhoods.get((city_slug, slug))
+        if imported and (
+            imported[0] != stored[0] or (imported[1] is not None and imported[1:] != tuple(stored[1:]))
+        ):
+            neighborhood_ids.append(pk)
+    return city_ids, neighborhood_ids
+
+
+def _bulk_upsert(geography, batch_size):
+    City.objects.bulk_create(
+        [City(slug=slug, name=name, state=state) for slug, (name, state) in geography.cities.items()],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["slug"],
+        update_fields=["name"],
+    )
+    city_ids = {}
+    slugs = list(geography.cities)
+    for start in range(0, len(slugs), batch_size):
+        city_ids.update(
+            City.objects.filter(slug__in=slugs[start:start + batch_size]).values_list("slug", "pk")
+        )
+    neighborhoods = [
+        Neighborhood(
+            city_id=city_ids[city_slug], slug=slug, name=name, latitude=lat, longitude=lng
+        )
+        for (city_slug, slug), (name, lat, lng) in geography.neighborhoods.items()
+    ]
+    # Rows without coordinates must not overwrite ones already stored.
+    for rows, update_fields in [
+        ([n for n in neighborhoods if n.latitude is not None], ["name", "latitude", "longitude"]),
+        ([n for n in neighborhoods if n.latitude is None], ["name"]),
+    ]:
+        Neighborhood.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["city", "slug"],
+            update_fields=update_fields,
+        )
+
+
+def _copy(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _copy_upsert(geography):
+    city_table = connection.ops.quote_name(City._meta.db_table)
+    neighborhood_table = connection.ops.quote_name(Neighborhood._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE import_city (slug text, name text, state text) ON COMMIT DROP"
+        )
+        _copy(cursor, "import_city", ["slug", "name", "state"], (
+            (slug, name, state) for slug, (name, state) in geography.cities.items()
+        ))
+        cursor.execute(f"""
+            INSERT INTO {city_table} (slug, name, state)
+            SELECT slug, name, state FROM import_city
+            ON CONFLICT (slug) DO UPDATE SET name = EXCLUDED.name
+        """)
+
+        cursor.execute(
+            "CREATE TEMP TABLE import_neighborhood (city_slug text, slug text, name text, "
+            "latitude double precision, longitude double precision) ON COMMIT DROP"
+        )
+        _copy(cursor, "import_neighborhood", ["city_slug", "slug", "name", "latitude", "longitude"], (
+            (city_slug, slug, name, lat, lng)
+            for (city_slug, slug), (name, lat, lng) in geography.neighborhoods.items()
+        ))
+        cursor.execute(f"""
+            INSERT INTO {neighborhood_table} AS existing (city_id, slug, name, latitude, longitude)
+            SELECT city.id, n.slug, n.name, n.latitude, n.longitude
+            FROM import_neighborhood n JOIN {city_table} city ON city.slug = n.city_slug
+            ON CONFLICT (city_id, slug) DO UPDATE SET
+                name = EXCLUDED.name,
+                latitude = COALESCE(EXCLUDED.latitude, existing.latitude),
+                longitude = COALESCE(EXCLUDED.longitude, existing.longitude)
+        """)
@@ -0,0 +1,64 @@
+"""
+Join path for activities that stays correct under a flash crowd.
+
+The join row insert and the capacity-checked counter bump run in one short
+transaction. The counter is changed with a single conditional UPDATE, so the
+database serializes concurrent joiners on the activity row and a full or
+closed activity never over-counts. A repeated submit from the same session
+hits the unique (activity, session_key) constraint and is reported as
+already joined instead of raising; any other integrity error (say the
+activity was deleted or archived meanwhile) is reported as closed. A
+successful join publishes the new count to live listeners once it commits,
+and updates the activity's listing in the same transaction.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import live
+from .models import Activity, ActivityJoin, ActivityListing
+
+JOINED = "joined"
+ALREADY_JOINED = "already_joined"
+FULL = "full"
+CLOSED = "closed"
+
+
+class _Rejected(Exception):
+    pass
+
+
+def join_activity(activity_id, session_key):
+    """Record a join for session_key and return one of the result constants."""
+    try:
+        with transaction.atomic():
+            ActivityJoin.objects.create(activity_id=activity_id, session_key=session_key)
+            now = timezone.now()
+            bumped = Activity.objects.filter(
+                pk=activity_id,
+                status=Activity.Status.ACTIVE,
+                helpers_joined__lt=F("helpers_needed"),
+            ).update(
+                helpers_joined=F("helpers_joined") + 1,
+                updated_at=now,
+            )
+            if not bumped:
+                raise _Rejected
+            ActivityListing.objects.filter(pk=activity_id).update(
+                helpers_joined=F("helpers_joined") + 1,
+                helpers_remaining=F("helpers_remaining") - 1,
+                updated_at=now,
+            )
+            transaction.on_commit(lambda: live.publish_activity(activity_id))
+    except IntegrityError:
+        already = ActivityJoin.objects.filter(
+            activity_id=activity_id, session_key=session_key
+        ).exists()
+        return ALREADY_JOINED if already else CLOSED
+    except _Rejected:
+        is_active = Activity.objects.filter(
+            pk=activity_id, status=Activity.Status.ACTIVE
+        ).exists()
+        return FULL if is_active else CLOSED
+    return JOINED
@@ -0,0 +1,94 @@
+"""
+Signed cookie listing the activities this browser's session has joined.
+
+The activity detail page needs to know whether the visitor already joined.
+The ledger answers that without a query. ``ActivityJoin`` stays the source
+of truth: a missing, tampered, foreign (other session) or truncated ledger
+falls back to the database. The cookie names its session by a salted HMAC
+of the session key, never the key itself.
+"""
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import ActivityJoin
+
+COOKIE_NAME = "joined"
+SALT = "activities.ledger"
+MAX_ENTRIES = 50
+
+COMPLETE = "c"
+TRUNCATED = "t"
+
+
+def _owner(session_key):
+    return salted_hmac(SALT, session_key).hexdigest()
+
+
+def _read(request, session_key):
+    value = request.get_signed_cookie(
+        COOKIE_NAME, default=None, salt=SALT, max_age=settings.SESSION_COOKIE_AGE
+    )
+    if value is None:
+        return None
+    try:
+        owner, state, ids = value.split("|")
+        ids = [int(pk) for pk in ids.split(",") if pk]
+    except ValueError:
+        return None
+    if not constant_time_compare(owner, _owner(session_key)):
+        return None
+    return ids, state == COMPLETE
+
+
+def has_joined(request, activity_id, join_model=ActivityJoin):
+    session_key = request.session.session_key
+    if not session_key:
+        return False
+    ledger = _read(request, session_key)
+    if ledger is not None:
+        ids, complete = ledger
+        if activity_id in ids:
+            return True
+        if complete:
+            return False
+    return join_model.objects.filter(
+        activity_id=activity_id, session_key=session_key
+    ).exists()
+
+
+def record(request, response, activity_id):
+    """Add activity_id to the ledger cookie set on response."""
+    session_key = request.session.session_key
+    ledger = _read(request, session_key)
+    if ledger is None:
+        # Seed from the database so the new ledger is complete.
+        recent = list(
+            ActivityJoin.objects.filter(session_key=session_key)
+            .order_by("-joined_at")
+            .values_list("activity_id", flat=True)[:MAX_ENTRIES + 1]
+        )
+        ids = recent[::-1]
+        complete = len(recent) <= MAX_ENTRIES
+    else:
+        ids, complete = ledger
+
+    ids = [pk for pk in ids if pk != activity_id] + [activity_id]
+    if len(ids) > MAX_ENTRIES:
+        ids = ids[-MAX_ENTRIES:]
+        complete = False
+
+    value = "|".join([
+        _owner(session_key),
+        COMPLETE if complete else TRUNCATED,
+        ",".join(str(pk) for pk in ids),
+    ])
+    response.set_signed_cookie(
+        COOKIE_NAME,
+        value,
+        salt=SALT,
+        max_age=settings.SESSION_COOKIE_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
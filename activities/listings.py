@@ -0,0 +1,119 @@
+"""
+Maintenance of the ``ActivityListing`` read model.
+
+Each live activity (active and not yet ended) has one listing row carrying
+everything a card, a map search or a feed needs, including its city and
+neighborhood names and slugs, its full location string and its absolute
+URL. Readers query that one table instead of joining ``Activity`` to
+``Neighborhood`` and ``City``.
+
+Like the rollups, listings are refreshed after commit from the model
+signals, with two exceptions. Joins bump the listing's counters in the join
+transaction itself. Bulk paths (the sweeper, the archiver, imports,
+``generate_data``) refresh or rebuild explicitly, since they skip signals.
+Ended listings are removed by the sweeper; browse queries filter on
+``ends_at`` anyway, so a row is never shown after its activity ends.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Activity, ActivityListing
+
+BATCH_SIZE = 1000
+
+COPIED_FIELDS = [
+    "title", "description", "location_hint", "starts_at", "duration_minutes",
+    "ends_at", "helpers_needed", "helpers_joined", "updated_at",
+]
+UPDATE_FIELDS = [
+    f.name for f in ActivityListing._meta.concrete_fields if not f.primary_key
+]
+
+
+def live(now=None):
+    return (
+        Activity.objects.active()
+        .filter(ends_at__gt=now or timezone.now())
+        .select_related("neighborhood__city")
+    )
+
+
+def listing_for(activity):
+    neighborhood = activity.neighborhood
+    city = neighborhood.city
+    coordinates = activity.coordinates or (None, None)
+    return ActivityListing(
+        activity_id=activity.pk,
+        city_id=city.pk,
+        city_slug=city.slug,
+        city_name=city.name,
+        city_state=city.state,
+        neighborhood_id=neighborhood.pk,
+        neighborhood_slug=neighborhood.slug,
+        neighborhood_name=neighborhood.name,
+        location=f"{activity.location_hint}, {neighborhood.name}, {city.name}, {city.state}",
+        helpers_remaining=activity.helpers_remaining,
+        latitude=coordinates[0],
+        longitude=coordinates[1],
+        url=reverse("activity_detail", kwargs={"pk": activity.pk}),
+        **{name: getattr(activity, name) for name in COPIED_FIELDS},
+    )
+
+
+def _write(activities):
+    ActivityListing.objects.bulk_create(
+        [listing_for(activity) for activity in activities],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["activity"],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def refresh(activity_ids):
+    """Bring the listings of these activities in line with their rows."""
+    activity_ids = set(activity_ids)
+    with transaction.atomic():
+        # Lock the activities so a concurrent join's listing bump lands after this write.
+        activities = list(live().filter(pk__in=activity_ids).select_for_update(of=("self",)))
+        _write(activities)
+        ActivityListing.objects.filter(pk__in=activity_ids).exclude(
+            pk__in=[activity.pk for activity in activities]
+        ).delete()
+
+
+def refresh_neighborhood(neighborhood_id):
+    refresh(live().filter(neighborhood_id=neighborhood_id).values_list("pk", flat=True))
+
+
+def refresh_city(city_id):
+    refresh(live().filter(neighborhood__city_id=city_id).values_list("pk", flat=True))
+
+
+def refresh_locations(city_ids, neighborhood_ids):
+    """Refresh the listings of activities in these cities and neighborhoods."""
+    refresh(
+        live()
+        .filter(Q(neighborhood__city_id__in=city_ids) | Q(neighborhood_id__in=neighborhood_ids))
+        .values_list("pk", flat=True)
+    )
+
+
+def remove(activity_ids):
+    ActivityListing.objects.filter(pk__in=list(activity_ids)).delete()
+
+
+def rebuild():
+    """Recreate every listing from the activities table."""
+    with transaction.atomic():
+        ActivityListing.objects.all().delete()
+        batch = []
+        for activity in live().iterator(chunk_size=BATCH_SIZE):
+            batch.append(activity)
+            if len(batch) == BATCH_SIZE:
+                _write(batch)
+                batch = []
+        _write(batch)
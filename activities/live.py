@@ -0,0 +1,198 @@
+"""
+Live helper counts and status over Server-Sent Events.
+
+Writes publish a small event after they commit (``publish_activity`` from the
+join path, the ``post_save`` signal for everything else). Each worker process
+fans events out to its SSE listeners through one in-memory ``Hub``, so an
+idle listener costs an ``asyncio.Queue`` and a suspended coroutine, not a
+thread or a database connection: Django only releases a request's connection
+at ``request_finished``, which for a stream is when the client leaves, so the
+stream closes it itself once the snapshot is read.
+
+On PostgreSQL events travel through ``NOTIFY`` and one ``LISTEN`` connection
+per worker feeds the hub, so every worker sees every event. Other databases
+deliver in process only, which is enough for a single-worker dev server.
+
+Streams are only offered under ASGI. A sync (WSGI) worker would spend itself
+on each open stream, so there pages render without ``sse-connect`` and the
+events views answer 204, which tells an ``EventSource`` not to reconnect.
+
+The stream sends two event types per activity, shaped for the htmx SSE
+extension: ``helpers-<pk>`` (the new ``helpers_joined``) and, once the
+activity closes or fills up, ``state-<pk>`` (its status).
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import StreamingHttpResponse
+
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "activities_live"
+KEEPALIVE = 15
+QUEUE_SIZE = 100
+
+
+def event_for(activity):
+    return {
+        "id": activity.pk,
+        "neighborhood": activity.neighborhood_id,
+        "helpers_joined": activity.helpers_joined,
+        "helpers_needed": activity.helpers_needed,
+        "status": activity.status,
+    }
+
+
+def _offer(queue, event):
+    if queue.full():
+        # A listener this far behind only needs the latest counts.
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class Hub:
+    """Per-process fan-out from published events to SSE listeners."""
+
+    def __init__(self):
+        self._listeners = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def listen(self, key):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._listeners[key].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._listeners[key].discard(entry)
+                if not self._listeners[key]:
+                    del self._listeners[key]
+
+    def listener_count(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._listeners.values())
+
+    def deliver(self, event):
+        keys = (f"activity:{event['id']}", f"neighborhood:{event['neighborhood']}")
+        with self._lock:
+            targets = [entry for key in keys for entry in self._listeners.get(key, ())]
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                pass  # The listener's loop has shut down.
+
+
+hub = Hub()
+_listener_started = threading.Lock()
+_listener_thread = None
+
+
+def publish(event):
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(event)])
+    else:
+        hub.deliver(event)
+
+
+def publish_activity(activity_id):
+    activity = (
+        Activity.objects.filter(pk=activity_id)
+        .only("neighborhood_id", "helpers_joined", "helpers_needed", "status")
+        .first()
+    )
+    if activity is not None:
+        publish(event_for(activity))
+
+
+def _receive_notifications():
+    """Feed NOTIFY payloads into the hub; reconnect if the connection drops."""
+    while True:
+        try:
+            # A connection of its own, never one of the pool's.
+            raw = connection.Database.connect(**connection.get_connection_params())
+            raw.autocommit = True
+            raw.cursor().execute(f"LISTEN {CHANNEL}")
+            if callable(raw.notifies):  # psycopg 3
+                for notify in raw.notifies():
+                    hub.deliver(json.loads(notify.payload))
+            else:  # psycopg2
+                while True:
+                    select.select([raw], [], [], 60)
+                    raw.poll()
+                    while raw.notifies:
+                        hub.deliver(json.loads(raw.notifies.pop(0).payload))
+        except Exception:
+            logger.exception("LISTEN %s failed; reconnecting", CHANNEL)
+            time.sleep(1)
+
+
+def _ensure_listener():
+    global _listener_thread
+    if connection.vendor != "postgresql":
+        return
+    with _listener_started:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(
+                target=_receive_notifications, name="activities-live", daemon=True
+            )
+            _listener_thread.start()
+
+
+def _release_connection():
+    # Runs in the request's thread-sensitive executor, which owns its connection.
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def format_event(event):
+    pk, joined = event["id"], event["helpers_joined"]
+    frames = [f"event: helpers-{pk}\ndata: {joined}\n\n"]
+    if event["status"] != Activity.Status.ACTIVE or joined >= event["helpers_needed"]:
+        frames.append(f"event: state-{pk}\ndata: {event['status']}\n\n")
+    return "".join(frames)
+
+
+async def _stream(key, snapshot):
+    _ensure_listener()
+    with hub.listen(key) as queue:
+        yield "retry: 5000\n\n"
+        # Read the snapshot after subscribing so no update falls in between.
+        for event in await snapshot():
+            yield format_event(event)
+        await sync_to_async(_release_connection)()
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+
+
+def supported(request):
+    """Whether request is served over ASGI, where an open stream costs no worker."""
+    return isinstance(request, ASGIRequest)
+
+
+def event_stream(key, snapshot):
+    """An SSE response for `key`, starting with the events `snapshot` returns."""
+    response = StreamingHttpResponse(_stream(key, snapshot), content_type="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
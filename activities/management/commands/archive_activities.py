@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from activities import archive, pagecache
+
+
+class Command(BaseCommand):
+    help = (
+        "Move activities that ended more than ARCHIVE_AFTER_DAYS ago, and their "
+        "joins, into the archive tables in bounded batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, default=None,
+                            help="Stop after this many batches (default: until done).")
+        parser.add_argument("--sleep", type=float, default=0.0,
+                            help="Seconds to pause between batches to ease load.")
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        before = archive.cutoff()
+        total = batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            moved = archive.archive_batch(before, options["batch_size"])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  batch {batches}: {moved} activities")
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} activities that ended before {before:%Y-%m-%d %H:%M}."
+        ))
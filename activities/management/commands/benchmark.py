@@ -0,0 +1,358 @@
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from activities import pagination
+from activities.models import Activity, City, Neighborhood
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+QUERIES_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+SEARCH_TERMS = ["st", "sou", "ben", "oak", "park", "lake", "cedar", "mill", "hill", "spring"]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """One simulated visitor: its own cookie jar, so sessions and CSRF work."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def request(self, path, data=None, headers=None, frames=None):
+        """Fetch path. With frames, read only that many event-stream frames, then hang up."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                content = response.read() if frames is None else read_frames(response, frames)
+                status, timing = response.status, response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as error:
+            content = error.read()
+            status, timing = error.code, error.headers.get("Server-Timing", "")
+        except OSError:
+            # Timed out or refused; reported as status 0.
+            content, status, timing = b"", 0, ""
+        elapsed = time.perf_counter() - start
+        match = QUERIES_RE.search(timing)
+        return status, elapsed, int(match.group(2)) if match else None, content
+
+
+def read_frames(response, frames):
+    """Read the first `frames` blank-line-terminated frames of an event stream."""
+    content = b""
+    while frames and (line := response.readline()):
+        content += line
+        if line == b"\n":
+            frames -= 1
+    return content
+
+
+class SlowClients:
+    """Connections that trickle their request headers, like phones on a bad link.
+
+    A sync worker is tied up by each one until its request completes, an
+    async worker is not; this is what --slow-clients measures.
+    """
+
+    def __init__(self, base_url, count):
+        self.address = urllib.parse.urlparse(base_url)
+        self.count = count
+        self.stop = threading.Event()
+        self.threads = []
+
+    def __enter__(self):
+        for _ in range(self.count):
+            thread = threading.Thread(target=self.trickle, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        time.sleep(0.5)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def trickle(self):
+        address = (self.address.hostname, self.address.port or 80)
+        with socket.create_connection(address) as sock:
+            sock.sendall(f"GET / HTTP/1.1\r\nHost: {self.address.netloc}\r\n".encode())
+            while not self.stop.wait(1):
+                try:
+                    sock.sendall(b"X-Slow: 1\r\n")
+                except OSError:
+                    return
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test every route in activities/urls.py against a running server "
+        "(or a gunicorn it starts) and report latency percentiles, throughput "
+        "and queries per request. Results are saved as JSON for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--spawn", action="store_true",
+                            help="Start a local gunicorn on --base-url for the run.")
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn workers with --spawn.")
+        parser.add_argument("--worker-class", default="sync", help="gunicorn worker class with --spawn.")
+        parser.add_argument("--threads", type=int, default=1, help="Threads per sync worker with --spawn.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per route.")
+        parser.add_argument("--routes", nargs="*", help="Only run these URL names.")
+        parser.add_argument("--slow-clients", type=int, default=0,
+                            help="Hold this many trickling connections open during the run.")
+        parser.add_argument("--timeout", type=float, default=10.0,
+                            help="Per-request client timeout in seconds.")
+        parser.add_argument("--label", default="", help="Free-form label stored with the results.")
+        parser.add_argument("--output", default=None,
+                            help="JSON file to write (default: benchmarks/<timestamp>.json).")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.base_url = options["base_url"].rstrip("/")
+        targets = self.load_targets()
+        routes = self.routes(targets)
+        if options["routes"]:
+            routes = {name: make for name, make in routes.items() if name in options["routes"]}
+
+        server = self.spawn(options) if options["spawn"] else None
+        try:
+            with SlowClients(self.base_url, options["slow_clients"]):
+                results = {
+                    name: self.run_route(name, make, options)
+                    for name, make in routes.items()
+                }
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        self.print_table(results)
+        report = {
+            "label": options["label"],
+            "started_at": timezone.now().isoformat(),
+            "base_url": self.base_url,
+            "concurrency": options["concurrency"],
+            "requests_per_route": options["requests"],
+            "slow_clients": options["slow_clients"],
+            "server": {
+                "spawned": options["spawn"],
+                "workers": options["workers"],
+                "worker_class": options["worker_class"],
+                "settings": self.server_settings(options) if options["spawn"] else None,
+            },
+            "dataset": {
+                "cities": City.objects.count(),
+                "neighborhoods": Neighborhood.objects.count(),
+                "activities": Activity.objects.count(),
+            },
+            "routes": results,
+        }
+        output = Path(options["output"] or settings.BASE_DIR / "benchmarks" /
+                      f"{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+    def load_targets(self):
+        activities = list(
+            Activity.objects.active()
+            .in_window(Activity.Window.WEEK)
+            .select_related("neighborhood__city")
+            .order_by("?")[:500]
+        )
+        if not activities:
+            raise CommandError("No upcoming activities; run generate_data first.")
+        return activities
+
+    def routes(self, activities):
+        pick = lambda: self.rng.choice(activities)  # noqa: E731
+        filters = ["now", "today", "week"]
+        htmx = {"HX-Request": "true"}
+
+        def join(client):
+            if not hasattr(client, "csrf_token"):
+                # Full or already-joined activities render no form, so take
+                # the token from the post page, which always has one.
+                result = client.request(reverse("activity_post"))
+                token = CSRF_RE.search(result[3].decode())
+                if token is None:
+                    return result
+                client.csrf_token = token.group(1)
+            return client.request(
+                reverse("activity_join", args=[pick().pk]),
+                data={"csrfmiddlewaretoken": client.csrf_token},
+                headers=htmx,
+            )
+
+        def more(client):
+            activity = pick()
+            neighborhood = activity.neighborhood
+            return client.request(
+                reverse("neighborhood_activities", args=[neighborhood.city.slug, neighborhood.slug])
+                + "?filter=week&after=" + pagination.encode_cursor(activity),
+                headers=htmx,
+            )
+
+        def neighborhood_args():
+            neighborhood = pick().neighborhood
+            return [neighborhood.city.slug, neighborhood.slug]
+
+        # Clients poll the full feed with `since`, so only recent changes come back.
+        since = urllib.parse.quote((timezone.now() - timezone.timedelta(hours=1)).isoformat())
+
+        def near_me(client):
+            lat, lng = pick().coordinates or (0, 0)
+            return client.request(f"{reverse('near_me')}?lat={lat:.5f}&lng={lng:.5f}&radius=5")
+
+        return {
+            "home": lambda c: c.request(reverse("home")),
+            "search_locations": lambda c: c.request(
+                reverse("search_locations") + "?q=" + self.rng.choice(SEARCH_TERMS), headers=htmx
+            ),
+            "activity_post": lambda c: c.request(reverse("activity_post")),
+            "activity_detail": lambda c: c.request(pick().get_absolute_url()),
+            "near_me": near_me,
+            "activity_join": join,
+            "activity_directions": lambda c: c.request(
+                reverse("activity_directions", args=[pick().pk])
+            ),
+            "activity_manage": lambda c: c.request(pick().get_manage_url()),
+            "city_detail": lambda c: c.request(
+                pick().neighborhood.city.get_absolute_url() + "?filter=" + self.rng.choice(filters)
+            ),
+            "neighborhood_detail": lambda c: c.request(
+                pick().neighborhood.get_absolute_url() + "?filter=" + self.rng.choice(filters)
+            ),
+            "neighborhood_activities": more,
+            "api_activities": lambda c: c.request(f"{reverse('api_activities')}?since={since}"),
+            "api_city_activities": lambda c: c.request(
+                reverse("api_city_activities", args=neighborhood_args()[:1])
+                + "?filter=" + self.rng.choice(filters)
+            ),
+            "api_neighborhood_activities": lambda c: c.request(
+                reverse("api_neighborhood_activities", args=neighborhood_args())
+                + "?filter=" + self.rng.choice(filters)
+            ),
+            # Streams stay open: time the "retry" frame and the snapshot, then hang up.
+            "activity_events": lambda c: c.request(
+                reverse("activity_events", args=[pick().pk]), frames=2
+            ),
+            "neighborhood_events": lambda c: c.request(
+                reverse("neighborhood_events", args=neighborhood_args()), frames=1
+            ),
+        }
+
+    def server_settings(self, options):
+        """Environment for the spawned server's settings.py, matched to its worker class.
+
+        settings.py picks connection reuse and the pool size from the worker
+        class and counts, so they are passed explicitly rather than left to
+        defaults meant for the other kind of worker.
+        """
+        sync = options["worker_class"] == "sync"
+        # An ASGI worker serves its share of the clients (and slow clients) at once.
+        per_worker = -(-(options["concurrency"] + options["slow_clients"]) // options["workers"])
+        return {
+            "GUNICORN_WORKER_CLASS": options["worker_class"],
+            "WEB_CONCURRENCY": str(options["workers"]),
+            "GUNICORN_THREADS": str(options["threads"] if sync else 1),
+            "ASGI_REQUEST_CONCURRENCY": str(per_worker),
+            "DB_POOL_MAX_SIZE": str(options["threads"] if sync else per_worker),
+            # Every simulated visitor comes from this one IP, so turn rate limits off.
+            "RATE_LIMIT_ENABLED": "False",
+        }
+
+    def spawn(self, options):
+        bind = urllib.parse.urlparse(self.base_url).netloc
+        sync = options["worker_class"] == "sync"
+        app = "barnraise.wsgi:application" if sync else "barnraise.asgi:application"
+        server = subprocess.Popen([
+            sys.executable, "-m", "gunicorn", app,
+            "--bind", bind,
+            "--workers", str(options["workers"]),
+            "--worker-class", options["worker_class"],
+            "--threads", str(options["threads"] if sync else 1),
+        ], env={**os.environ, **self.server_settings(options)})
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(self.base_url + reverse("home"), timeout=1)
+                return server
+            except OSError:
+                time.sleep(0.1)
+        server.terminate()
+        raise CommandError("gunicorn did not come up")
+
+    def run_route(self, name, make, options):
+        concurrency, total = options["concurrency"], options["requests"]
+        self.stdout.write(f"{name}: {total} requests at concurrency {concurrency}")
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, "client"):
+                local.client = Client(self.base_url, options["timeout"])
+            status, elapsed, queries, _ = make(local.client)
+            return status, elapsed, queries
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, range(total)))
+        wall = time.perf_counter() - start
+
+        latencies = sorted(elapsed * 1000 for _, elapsed, _ in samples)
+        queries = [q for _, _, q in samples if q is not None]
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": total,
+            "errors": sum(1 for status, _, _ in samples if status >= 500 or status == 0),
+            "statuses": {
+                str(code): sum(1 for status, _, _ in samples if status == code)
+                for code in sorted({status for status, _, _ in samples})
+            },
+            "throughput_rps": round(total / wall, 1),
+            "p50_ms": round(cuts[49], 2),
+            "p95_ms": round(cuts[94], 2),
+            "p99_ms": round(cuts[98], 2),
+            "max_ms": round(latencies[-1], 2),
+            "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+        }
+
+    def print_table(self, results):
+        header = f"{'route':<30}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}{'errors':>7}"
+        self.stdout.write(header)
+        for name, r in results.items():
+            queries = "-" if r["queries_per_request"] is None else r["queries_per_request"]
+            self.stdout.write(
+                f"{name:<30}{r['throughput_rps']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                f"{r['p99_ms']:>9}{queries:>7}{r['errors']:>7}"
+            )
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from activities import cards
+from activities.models import Activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering a long list of activity cards without the card cache, "
+        "with a cold cache and with a warm cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        activities = [
+            Activity(
+                pk=1_000_000 + i,
+                title=f"Benchmark activity {i}",
+                location_hint="Behind the community garden",
+                starts_at=now + timezone.timedelta(minutes=15 * (i - 8)),
+                duration_minutes=120,
+                ends_at=now + timezone.timedelta(minutes=15 * (i - 8) + 120),
+                helpers_needed=10,
+                helpers_joined=i % 10,
+                updated_at=now,
+            )
+            for i in range(options["cards"])
+        ]
+
+        def keys():
+            minute = cards.bucket()
+            return [cards.card_key(activity, minute) for activity in activities]
+
+        def uncached():
+            for activity in activities:
+                render_to_string(cards.TEMPLATE, {"activity": activity})
+
+        def cold():
+            cache.delete_many(keys())
+            cards.render(activities)
+
+        def warm():
+            cards.render(activities)
+
+        self.stdout.write(f"{options['cards']} cards, median of {options['rounds']} rounds")
+        for name, run in [("uncached", uncached), ("cold cache", cold), ("warm cache", warm)]:
+            timings = []
+            for _ in range(options["rounds"]):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(f"{name:<12}{statistics.median(timings):>10.1f} ms")
+        cache.delete_many(keys())
@@ -0,0 +1,156 @@
+import itertools
+import random
+import secrets
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.text import slugify
+
+from activities import listings, pagecache, rollups, search
+from activities.models import Activity, ActivityJoin, City, Neighborhood
+
+TITLES = [
+    "Community garden work day", "Neighborhood cleanup", "Help moving boxes",
+    "Food bank sorting", "Trail maintenance", "Paint the fence",
+    "Garage sale setup", "Block party teardown", "Tool library shift",
+    "Tree planting", "Porch repair", "Little free library build",
+]
+NAME_WORDS = [
+    "Oak", "Cedar", "Maple", "River", "Hill", "Lake", "Park", "Mill", "Spring",
+    "Forest", "Bluff", "Meadow", "Union", "Lincoln", "Benton", "Carondelet",
+]
+NAME_SUFFIXES = ["Heights", "Park", "Square", "Grove", "Village", "Gardens", "West", "East"]
+CITY_NAMES = [
+    "Springfield", "Fairview", "Riverside", "Franklin", "Greenville", "Clinton",
+    "Madison", "Georgetown", "Salem", "Arlington", "Ashland", "Milton",
+]
+STATES = ["Missouri", "Illinois", "Texas", "Oregon", "Colorado", "Ohio", "Georgia"]
+DURATIONS = [30, 60, 90, 120, 180, 240]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic cities, neighborhoods, activities and joins at scale. "
+        "Activity volume per neighborhood follows a Zipf-like skew."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cities", type=int, default=100)
+        parser.add_argument("--neighborhoods", type=int, default=10_000,
+                            help="Total neighborhoods, spread across the cities.")
+        parser.add_argument("--activities", type=int, default=100_000)
+        parser.add_argument("--joins", type=float, default=0.5,
+                            help="Fraction of each activity's helper slots that get joined.")
+        parser.add_argument("--skew", type=float, default=1.1,
+                            help="Zipf exponent for activities per neighborhood (0 = uniform).")
+        parser.add_argument("--past-days", type=int, default=60)
+        parser.add_argument("--future-days", type=int, default=14)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        run = secrets.token_hex(3)
+
+        # Cities scattered over the continental US, neighborhoods within ~10 km.
+        centers = [(rng.uniform(30, 47), rng.uniform(-120, -75)) for _ in range(options["cities"])]
+        cities = City.objects.bulk_create(
+            [
+                City(name=f"{rng.choice(CITY_NAMES)} {i}", state=rng.choice(STATES),
+                     slug=slugify(f"synthetic-{run}-{i}"))
+                for i in range(options["cities"])
+            ],
+            batch_size=batch_size,
+        )
+        self.stdout.write(f"Created {len(cities)} cities")
+
+        neighborhoods = []
+        for i in range(options["neighborhoods"]):
+            name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}"
+            lat, lng = centers[i % len(cities)]
+            neighborhoods.append(Neighborhood(
+                city=cities[i % len(cities)],
+                name=name,
+                slug=slugify(f"{name}-{i}"),
+                latitude=lat + rng.uniform(-0.09, 0.09),
+                longitude=lng + rng.uniform(-0.12, 0.12),
+            ))
+        neighborhoods = Neighborhood.objects.bulk_create(neighborhoods, batch_size=batch_size)
+        self.stdout.write(f"Created {len(neighborhoods)} neighborhoods")
+
+        # Popular neighborhoods get most of the activity.
+        order = list(range(len(neighborhoods)))
+        rng.shuffle(order)
+        weights = [1 / (rank + 1) ** options["skew"] for rank in range(len(order))]
+        cum_weights = list(itertools.accumulate(weights))
+
+        now = timezone.now()
+        start = now - timedelta(days=options["past_days"])
+        span = (options["past_days"] + options["future_days"]) * 86400
+        created = 0
+        joins = 0
+        remaining = options["activities"]
+        while remaining:
+            count = min(batch_size, remaining)
+            picks = rng.choices(order, cum_weights=cum_weights, k=count)
+            batch = []
+            for index in picks:
+                starts_at = start + timedelta(seconds=rng.randrange(span))
+                duration = rng.choice(DURATIONS)
+                ends_at = starts_at + timedelta(minutes=duration)
+                helpers_needed = rng.randint(1, 10)
+                neighborhood = neighborhoods[index]
+                # About a third of hosts drop a pin; the rest use the neighborhood center.
+                pinned = rng.random() < 0.3
+                if ends_at < now:
+                    status = rng.choices(
+                        [Activity.Status.COMPLETED, Activity.Status.ACTIVE, Activity.Status.CANCELLED],
+                        weights=[70, 20, 10],
+                    )[0]
+                else:
+                    status = rng.choices(
+                        [Activity.Status.ACTIVE, Activity.Status.CANCELLED], weights=[95, 5]
+                    )[0]
+                batch.append(Activity(
+                    title=rng.choice(TITLES),
+                    description="Generated by generate_data.",
+                    neighborhood=neighborhood,
+                    location_hint=f"Near {rng.randint(1, 40)}th & Main",
+                    latitude=neighborhood.latitude + rng.uniform(-0.01, 0.01) if pinned else None,
+                    longitude=neighborhood.longitude + rng.uniform(-0.01, 0.01) if pinned else None,
+                    starts_at=starts_at,
+                    duration_minutes=duration,
+                    ends_at=ends_at,
+                    helpers_needed=helpers_needed,
+                    helpers_joined=min(
+                        helpers_needed,
+                        int(helpers_needed * options["joins"] * rng.random() * 2),
+                    ),
+                    host_email=f"host{rng.randrange(10**6)}@example.com",
+                    status=status,
+                    secret_token=secrets.token_urlsafe(32),
+                ))
+            batch = Activity.objects.bulk_create(batch)
+            join_rows = [
+                ActivityJoin(activity=activity, session_key=secrets.token_hex(16))
+                for activity in batch
+                for _ in range(activity.helpers_joined)
+            ]
+            ActivityJoin.objects.bulk_create(join_rows, batch_size=batch_size)
+            created += len(batch)
+            joins += len(join_rows)
+            remaining -= count
+            self.stdout.write(f"  {created} activities, {joins} joins")
+
+        # bulk_create skips the signals that maintain these.
+        rollups.rebuild()
+        listings.rebuild()
+        search.invalidate_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(cities)} cities, {len(neighborhoods)} neighborhoods, "
+            f"{created} activities and {joins} joins."
+        ))
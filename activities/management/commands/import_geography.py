@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from activities import geography, pagecache
+
+
+class Command(BaseCommand):
+    help = (
+        "Load cities and neighborhoods from CSV or GeoJSON files, upserting on "
+        "the city slug and (city, neighborhood slug)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help=".csv, .geojson or .json files")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Parse and dedupe only; write nothing.")
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        start = time.perf_counter()
+        try:
+            data = geography.read(options["paths"])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f"Read {len(data.cities)} cities and {len(data.neighborhoods)} neighborhoods "
+            f"({data.duplicates} duplicate rows merged)"
+        )
+        if options["dry_run"]:
+            return
+
+        cities, neighborhoods = geography.load(data, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Upserted {cities} cities and {neighborhoods} neighborhoods "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from activities import pagecache, rollups
+from activities.models import ActivityCount
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-neighborhood and per-city activity count rollups."
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {ActivityCount.objects.count()} activity count rows."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from activities import listings, pagecache
+from activities.models import ActivityListing
+
+
+class Command(BaseCommand):
+    help = "Recreate the ActivityListing read model from the activities table."
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        listings.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {ActivityListing.objects.count()} activity listings."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from activities import search
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters for the search_locations fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters afterwards.")
+
+    def handle(self, *args, **options):
+        stats = search.results_cache_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} "
+            f"hit_ratio={stats['hit_ratio']:.1%} ttl={stats['ttl']}s"
+        )
+        if options["reset"]:
+            search.reset_results_cache_stats()
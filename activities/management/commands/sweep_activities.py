@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from activities import pagecache, rollups, sweeper
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark active activities that have already ended as completed and "
+        "save activity counts whose time window has moved on. "
+        "Safe to run from cron at any interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not pagecache.shared():
+            self.stderr.write(self.style.WARNING(pagecache.LOCAL_CACHE_WARNING))
+        completed = sweeper.sweep(batch_size=options["batch_size"])
+        refreshed = rollups.refresh_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f"Completed {completed} ended activities; "
+            f"refreshed counts for {refreshed} neighborhoods."
+        ))
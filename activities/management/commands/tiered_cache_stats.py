@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from activities import tiered
+
+
+class Command(BaseCommand):
+    help = "Show L1/L2 hit counters for each tiered cache family."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters afterwards.")
+
+    def handle(self, *args, **options):
+        for name, row in tiered.stats().items():
+            self.stdout.write(
+                f"{name}: l1={row['l1']} l2={row['l2']} stale={row['stale']} "
+                f"miss={row['miss']} hit_ratio={row['hit_ratio']:.1%}"
+            )
+        if options["reset"]:
+            tiered.reset_stats()
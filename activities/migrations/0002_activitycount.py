@@ -0,0 +1,79 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "window",
+                    models.CharField(
+                        choices=[
+                            ("now", "Now"),
+                            ("today", "Today"),
+                            ("week", "This week"),
+                            ("upcoming", "Upcoming"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_counts",
+                        to="activities.city",
+                    ),
+                ),
+                (
+                    "neighborhood",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_counts",
+                        to="activities.neighborhood",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["window", "expires_at"], name="activitycount_expiry_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("neighborhood__isnull", False)),
+                        fields=("neighborhood", "window"),
+                        name="unique_neighborhood_window_count",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("neighborhood__isnull", True)),
+                        fields=("city", "window"),
+                        name="unique_city_window_count",
+                    ),
+                ],
+            },
+        ),
+    ]
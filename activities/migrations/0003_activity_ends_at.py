@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_ends_at(apps, schema_editor):
+    Activity = apps.get_model("activities", "Activity")
+    batch = []
+    for activity in Activity.objects.only("starts_at", "duration_minutes").iterator():
+        activity.ends_at = activity.starts_at + timedelta(minutes=activity.duration_minutes)
+        batch.append(activity)
+        if len(batch) >= 1000:
+            Activity.objects.bulk_update(batch, ["ends_at"])
+            batch = []
+    Activity.objects.bulk_update(batch, ["ends_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0002_activitycount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activity",
+            name="ends_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="activity",
+            name="ends_at",
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["neighborhood", "status", "starts_at"],
+                name="activity_nbhd_status_start",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["neighborhood", "ends_at"],
+                name="activity_live_nbhd_end",
+            ),
+        ),
+    ]
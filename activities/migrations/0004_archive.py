@@ -0,0 +1,93 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:42
+
+import activities.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0003_activity_ends_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedActivity",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=200)),
+                ("description", models.TextField()),
+                ("location_hint", models.CharField(max_length=200)),
+                ("starts_at", models.DateTimeField()),
+                ("duration_minutes", models.PositiveIntegerField()),
+                ("ends_at", models.DateTimeField()),
+                ("helpers_needed", models.PositiveIntegerField()),
+                ("helpers_joined", models.PositiveIntegerField()),
+                ("host_email", models.EmailField(max_length=254)),
+                ("host_phone", models.CharField(blank=True, max_length=20)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("secret_token", models.CharField(max_length=64, unique=True)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "archived activities",
+                "ordering": ["-starts_at"],
+            },
+            bases=(activities.models.ActivityDisplayMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name="ArchivedJoin",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_key", models.CharField(max_length=40)),
+                ("joined_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(fields=["ends_at"], name="activity_ends_at_idx"),
+        ),
+        migrations.AddField(
+            model_name="archivedactivity",
+            name="neighborhood",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_activities",
+                to="activities.neighborhood",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedjoin",
+            name="activity",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="joins",
+                to="activities.archivedactivity",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="archivedjoin",
+            unique_together={("activity", "session_key")},
+        ),
+    ]
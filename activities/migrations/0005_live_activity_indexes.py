@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0004_archive"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="activity",
+            name="activity_nbhd_status_start",
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["neighborhood", "starts_at"],
+                name="activity_live_nbhd_start",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["ends_at"],
+                name="activity_live_end",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0005_live_activity_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["updated_at", "id"], name="activity_updated_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0006_activity_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activity",
+            name="latitude",
+            field=models.FloatField(
+                blank=True,
+                help_text="Leave empty to use the neighborhood's center",
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-90),
+                    django.core.validators.MaxValueValidator(90),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="activity",
+            name="longitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-180),
+                    django.core.validators.MaxValueValidator(180),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedactivity",
+            name="latitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-90),
+                    django.core.validators.MaxValueValidator(90),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedactivity",
+            name="longitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-180),
+                    django.core.validators.MaxValueValidator(180),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="neighborhood",
+            name="latitude",
+            field=models.FloatField(
+                blank=True,
+                help_text="Center of the neighborhood",
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-90),
+                    django.core.validators.MaxValueValidator(90),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="neighborhood",
+            name="longitude",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(-180),
+                    django.core.validators.MaxValueValidator(180),
+                ],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["latitude", "longitude"],
+                name="activity_live_latlng",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="neighborhood",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="neighborhood_latlng_idx"
+            ),
+        ),
+    ]
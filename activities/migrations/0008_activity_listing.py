@@ -0,0 +1,176 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:01
+
+import activities.models
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.urls import reverse
+from django.utils import timezone
+
+
+def create_listings(apps, schema_editor):
+    Activity = apps.get_model("activities", "Activity")
+    ActivityListing = apps.get_model("activities", "ActivityListing")
+    live = Activity.objects.filter(status="active", ends_at__gt=timezone.now())
+    listings = []
+    for activity in live.select_related("neighborhood__city").iterator(chunk_size=1000):
+        neighborhood, city = activity.neighborhood, activity.neighborhood.city
+        if activity.latitude is not None and activity.longitude is not None:
+            latitude, longitude = activity.latitude, activity.longitude
+        else:
+            latitude, longitude = neighborhood.latitude, neighborhood.longitude
+        listings.append(ActivityListing(
+            activity_id=activity.pk,
+            city_id=city.pk,
+            city_slug=city.slug,
+            city_name=city.name,
+            city_state=city.state,
+            neighborhood_id=neighborhood.pk,
+            neighborhood_slug=neighborhood.slug,
+            neighborhood_name=neighborhood.name,
+            title=activity.title,
+            description=activity.description,
+            location_hint=activity.location_hint,
+            location=f"{activity.location_hint}, {neighborhood.name}, {city.name}, {city.state}",
+            starts_at=activity.starts_at,
+            duration_minutes=activity.duration_minutes,
+            ends_at=activity.ends_at,
+            helpers_needed=activity.helpers_needed,
+            helpers_joined=activity.helpers_joined,
+            helpers_remaining=max(0, activity.helpers_needed - activity.helpers_joined),
+            latitude=latitude,
+            longitude=longitude,
+            url=reverse("activity_detail", kwargs={"pk": activity.pk}),
+            updated_at=activity.updated_at,
+        ))
+    ActivityListing.objects.bulk_create(listings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0007_coordinates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityListing",
+            fields=[
+                (
+                    "activity",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="listing",
+                        serialize=False,
+                        to="activities.activity",
+                    ),
+                ),
+                ("city_slug", models.SlugField(db_index=False)),
+                ("city_name", models.CharField(max_length=100)),
+                ("city_state", models.CharField(max_length=100)),
+                ("neighborhood_slug", models.SlugField(db_index=False)),
+                ("neighborhood_name", models.CharField(max_length=100)),
+                ("title", models.CharField(max_length=200)),
+                ("description", models.TextField()),
+                ("location_hint", models.CharField(max_length=200)),
+                (
+                    "location",
+                    models.CharField(
+                        help_text="Full address for map searches", max_length=520
+                    ),
+                ),
+                ("starts_at", models.DateTimeField()),
+                ("duration_minutes", models.PositiveIntegerField()),
+                ("ends_at", models.DateTimeField()),
+                ("helpers_needed", models.PositiveIntegerField()),
+                ("helpers_joined", models.PositiveIntegerField()),
+                ("helpers_remaining", models.PositiveIntegerField()),
+                (
+                    "latitude",
+                    models.FloatField(
+                        blank=True,
+                        null=True,
+                        validators=[
+                            django.core.validators.MinValueValidator(-90),
+                            django.core.validators.MaxValueValidator(90),
+                        ],
+                    ),
+                ),
+                (
+                    "longitude",
+                    models.FloatField(
+                        blank=True,
+                        null=True,
+                        validators=[
+                            django.core.validators.MinValueValidator(-180),
+                            django.core.validators.MaxValueValidator(180),
+                        ],
+                    ),
+                ),
+                ("url", models.CharField(max_length=200)),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "ordering": ["starts_at"],
+            },
+            bases=(activities.models.ActivityDisplayMixin, models.Model),
+        ),
+        migrations.RemoveIndex(
+            model_name="activity",
+            name="activity_live_latlng",
+        ),
+        migrations.RemoveIndex(
+            model_name="neighborhood",
+            name="neighborhood_latlng_idx",
+        ),
+        migrations.AddField(
+            model_name="activitylisting",
+            name="city",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="listings",
+                to="activities.city",
+            ),
+        ),
+        migrations.AddField(
+            model_name="activitylisting",
+            name="neighborhood",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="listings",
+                to="activities.neighborhood",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(
+                fields=["neighborhood", "starts_at"], name="listing_nbhd_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(
+                fields=["neighborhood", "ends_at"], name="listing_nbhd_end"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(fields=["city", "starts_at"], name="listing_city_start"),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(fields=["latitude", "longitude"], name="listing_latlng"),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(fields=["ends_at"], name="listing_ends_at"),
+        ),
+        migrations.AddIndex(
+            model_name="activitylisting",
+            index=models.Index(
+                fields=["updated_at", "activity"], name="listing_updated_at"
+            ),
+        ),
+        migrations.RunPython(create_listings, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 import secrets
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils import timezone
 from django.urls import reverse
 
 
+# First path segments routed ahead of "<city_slug>/": a city with one of these
+# slugs would be unreachable.
+RESERVED_CITY_SLUGS = {"activity", "admin", "api", "manage", "near", "post", "search", "static"}
+
+
 class City(models.Model):
     name = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
@@ -16,14 +23,34 @@ class City(models.Model):
     def __str__(self):
         return f"{self.name}, {self.state}"
 
+    def clean(self):
+        if self.slug in RESERVED_CITY_SLUGS:
+            raise ValidationError({"slug": f"{self.slug!r} is the start of another page's URL."})
+
     def get_absolute_url(self):
         return reverse("city_detail", kwargs={"city_slug": self.slug})
 
 
+def latitude_field(**kwargs):
+    return models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)], **kwargs
+    )
+
+
+def longitude_field(**kwargs):
+    return models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)], **kwargs
+    )
+
+
 class Neighborhood(models.Model):
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="neighborhoods")
     name = models.CharField(max_length=100)
     slug = models.SlugField()
+    latitude = latitude_field(help_text="Center of the neighborhood")
+    longitude = longitude_field()
 
     class Meta:
         unique_together = ["city", "slug"]
@@ -39,12 +66,113 @@ class Neighborhood(models.Model):
         )
 
 
-class Activity(models.Model):
+def window_bounds(window, now):
+    """Return the (start, end) instants of a time window; end is None if open-ended."""
+    if window == Activity.Window.NOW:
+        return now, now
+    if window == Activity.Window.TODAY:
+        return now, timezone.localtime(now).replace(
+            hour=23, minute=59, second=59, microsecond=999999
+        )
+    if window == Activity.Window.WEEK:
+        return now, now + timezone.timedelta(days=7)
+    return now, None
+
+
+class WindowQuerySet(models.QuerySet):
+    def in_window(self, window, now=None):
+        """Activities whose [starts_at, ends_at) overlaps the window."""
+        start, end = window_bounds(window, now or timezone.now())
+        queryset = self.filter(ends_at__gt=start)
+        if end is not None:
+            queryset = queryset.filter(starts_at__lte=end)
+        return queryset
+
+
+class ActivityQuerySet(WindowQuerySet):
+    def active(self):
+        return self.filter(status=Activity.Status.ACTIVE)
+
+
+class ActivityDisplayMixin:
+    """Links and time labels shared by live and archived activities."""
+
+    is_archived = False
+
+    def get_absolute_url(self):
+        return reverse("activity_detail", kwargs={"pk": self.pk})
+
+    def get_manage_url(self):
+        return reverse("activity_manage", kwargs={"token": self.secret_token})
+
+    @property
+    def is_happening_now(self):
+        return self.starts_at <= timezone.now() < self.ends_at
+
+    @property
+    def is_upcoming(self):
+        return self.starts_at > timezone.now()
+
+    @property
+    def is_past(self):
+        return self.ends_at <= timezone.now()
+
+    @property
+    def coordinates(self):
+        """(latitude, longitude) of the activity, else of its neighborhood, else None."""
+        if self.latitude is not None and self.longitude is not None:
+            return self.latitude, self.longitude
+        if self.neighborhood.latitude is not None and self.neighborhood.longitude is not None:
+            return self.neighborhood.latitude, self.neighborhood.longitude
+        return None
+
+    @property
+    def helpers_remaining(self):
+        return max(0, self.helpers_needed - self.helpers_joined)
+
+    @property
+    def time_display(self):
+        today = timezone.localdate()
+        starts_at = timezone.localtime(self.starts_at)
+        if self.is_happening_now:
+            return "Happening now"
+        elif starts_at.date() == today:
+            return f"Today at {starts_at.strftime('%-I:%M %p')}"
+        elif starts_at.date() == today + timezone.timedelta(days=1):
+            return f"Tomorrow at {starts_at.strftime('%-I:%M %p')}"
+        else:
+            return starts_at.strftime("%a, %b %-d at %-I:%M %p")
+
+    @property
+    def duration_display(self):
+        hours = self.duration_minutes // 60
+        mins = self.duration_minutes % 60
+        if hours and mins:
+            return f"About {hours}h {mins}m"
+        elif hours:
+            return f"About {hours} hour{'s' if hours > 1 else ''}"
+        else:
+            return f"About {mins} minutes"
+
+
+class Activity(ActivityDisplayMixin, models.Model):
     class Status(models.TextChoices):
         ACTIVE = "active", "Active"
         COMPLETED = "completed", "Completed"
         CANCELLED = "cancelled", "Cancelled"
 
+    class Window(models.TextChoices):
+        NOW = "now", "Now"
+        TODAY = "today", "Today"
+        WEEK = "week", "This week"
+        UPCOMING = "upcoming", "Upcoming"
+
+        @classmethod
+        def from_filter(cls, time_filter):
+            if time_filter in (cls.NOW, cls.WEEK):
+                return cls(time_filter)
+            return cls.TODAY
+
     title = models.CharField(max_length=200)
     description = models.TextField()
     neighborhood = models.ForeignKey(
@@ -56,8 +184,11 @@ class Activity(models.Model):
     )
     starts_at = models.DateTimeField()
     duration_minutes = models.PositiveIntegerField(default=120)
+    ends_at = models.DateTimeField(editable=False)
     helpers_needed = models.PositiveIntegerField(default=1)
     helpers_joined = models.PositiveIntegerField(default=0)
+    latitude = latitude_field(help_text="Leave empty to use the neighborhood's center")
+    longitude = longitude_field()
     host_email = models.EmailField()
     host_phone = models.CharField(max_length=20, blank=True)
     status = models.CharField(
@@ -69,73 +200,219 @@ class Activity(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ActivityQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "activities"
         ordering = ["starts_at"]
+        # The browse queries only read active rows, and sweep_activities keeps
+        # "active" to activities that have not ended, so these partial indexes
+        # hold live data only.
+        indexes = [
+            models.Index(
+                fields=["neighborhood", "starts_at"],
+                condition=models.Q(status="active"),
+                name="activity_live_nbhd_start",
+            ),
+            models.Index(
+                fields=["neighborhood", "ends_at"],
+                condition=models.Q(status="active"),
+                name="activity_live_nbhd_end",
+            ),
+            models.Index(
+                fields=["ends_at"],
+                condition=models.Q(status="active"),
+                name="activity_live_end",
+            ),
+            models.Index(fields=["ends_at"], name="activity_ends_at_idx"),
+            # Incremental API fetches (?since=) scan updated_at in order.
+            models.Index(fields=["updated_at", "id"], name="activity_updated_at_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where the row lived so a move can refresh both rollups.
+        instance._loaded_neighborhood_id = instance.__dict__.get("neighborhood_id")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.secret_token:
             self.secret_token = secrets.token_urlsafe(32)
+        self.ends_at = self.starts_at + timezone.timedelta(minutes=self.duration_minutes)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"starts_at", "duration_minutes"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "ends_at"}
         super().save(*args, **kwargs)
 
-    def get_absolute_url(self):
-        return reverse("activity_detail", kwargs={"pk": self.pk})
 
-    def get_manage_url(self):
-        return reverse("activity_manage", kwargs={"token": self.secret_token})
+class ActivityJoin(models.Model):
+    activity = models.ForeignKey(
+        Activity, on_delete=models.CASCADE, related_name="joins"
+    )
+    session_key = models.CharField(max_length=40)
+    joined_at = models.DateTimeField(auto_now_add=True)
 
-    @property
-    def is_happening_now(self):
-        now = timezone.now()
-        end_time = self.starts_at + timezone.timedelta(minutes=self.duration_minutes)
-        return self.starts_at <= now <= end_time
+    class Meta:
+        unique_together = ["activity", "session_key"]
 
-    @property
-    def is_upcoming(self):
-        return self.starts_at > timezone.now()
+    def __str__(self):
+        return f"Join for {self.activity.title}"
 
-    @property
-    def is_past(self):
-        end_time = self.starts_at + timezone.timedelta(minutes=self.duration_minutes)
-        return end_time < timezone.now()
 
-    @property
-    def helpers_remaining(self):
-        return max(0, self.helpers_needed - self.helpers_joined)
+class ActivityCount(models.Model):
+    """Rollup of live activity counts per neighborhood and time window.
 
-    @property
-    def time_display(self):
-        now = timezone.now()
-        if self.is_happening_now:
-            return "Happening now"
-        elif self.starts_at.date() == now.date():
-            return f"Today at {self.starts_at.strftime('%-I:%M %p')}"
-        elif self.starts_at.date() == (now + timezone.timedelta(days=1)).date():
-            return f"Tomorrow at {self.starts_at.strftime('%-I:%M %p')}"
-        else:
-            return self.starts_at.strftime("%a, %b %-d at %-I:%M %p")
+    Rows with no neighborhood hold the city-wide totals. ``expires_at`` is the
+    next instant the count changes purely because time passed; see
+    ``activities.rollups``.
+    """
+
+    city = models.ForeignKey(
+        City, on_delete=models.CASCADE, related_name="activity_counts"
+    )
+    neighborhood = models.ForeignKey(
+        Neighborhood,
+        on_delete=models.CASCADE,
+        related_name="activity_counts",
+        null=True,
+        blank=True,
+    )
+    window = models.CharField(max_length=10, choices=Activity.Window.choices)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["neighborhood", "window"],
+                condition=models.Q(neighborhood__isnull=False),
+                name="unique_neighborhood_window_count",
+            ),
+            models.UniqueConstraint(
+                fields=["city", "window"],
+                condition=models.Q(neighborhood__isnull=True),
+                name="unique_city_window_count",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["window", "expires_at"], name="activitycount_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.window}: {self.count}"
+
+
+class ActivityListing(ActivityDisplayMixin, models.Model):
+    """Flat read model of one live activity, with its location denormalized.
+
+    Browse, near-me and feed queries read this table alone. Rows are kept in
+    step with ``Activity``, ``Neighborhood`` and ``City`` by
+    ``activities.listings``.
+    """
+
+    activity = models.OneToOneField(
+        Activity, on_delete=models.CASCADE, primary_key=True, related_name="listing"
+    )
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="listings")
+    city_slug = models.SlugField(db_index=False)
+    city_name = models.CharField(max_length=100)
+    city_state = models.CharField(max_length=100)
+    neighborhood = models.ForeignKey(
+        Neighborhood, on_delete=models.CASCADE, related_name="listings"
+    )
+    neighborhood_slug = models.SlugField(db_index=False)
+    neighborhood_name = models.CharField(max_length=100)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    location_hint = models.CharField(max_length=200)
+    location = models.CharField(max_length=520, help_text="Full address for map searches")
+    starts_at = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField()
+    ends_at = models.DateTimeField()
+    helpers_needed = models.PositiveIntegerField()
+    helpers_joined = models.PositiveIntegerField()
+    helpers_remaining = models.PositiveIntegerField()
+    # The activity's pin, else its neighborhood's center.
+    latitude = latitude_field()
+    longitude = longitude_field()
+    url = models.CharField(max_length=200)
+    updated_at = models.DateTimeField()
+
+    objects = WindowQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["starts_at"]
+        indexes = [
+            models.Index(fields=["neighborhood", "starts_at"], name="listing_nbhd_start"),
+            models.Index(fields=["neighborhood", "ends_at"], name="listing_nbhd_end"),
+            models.Index(fields=["city", "starts_at"], name="listing_city_start"),
+            models.Index(fields=["latitude", "longitude"], name="listing_latlng"),
+            models.Index(fields=["ends_at"], name="listing_ends_at"),
+            models.Index(fields=["updated_at", "activity"], name="listing_updated_at"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return self.url
 
     @property
-    def duration_display(self):
-        hours = self.duration_minutes // 60
-        mins = self.duration_minutes % 60
-        if hours and mins:
-            return f"About {hours}h {mins}m"
-        elif hours:
-            return f"About {hours} hour{'s' if hours > 1 else ''}"
-        else:
-            return f"About {mins} minutes"
+    def coordinates(self):
+        if self.latitude is None or self.longitude is None:
+            return None
+        return self.latitude, self.longitude
 
 
-class ActivityJoin(models.Model):
+class ArchivedActivity(ActivityDisplayMixin, models.Model):
+    """An activity moved out of the hot table by ``activities.archive``.
+
+    The primary key and secret token are kept, so detail and manage links
+    keep working after archival.
+    """
+
+    is_archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    neighborhood = models.ForeignKey(
+        Neighborhood, on_delete=models.CASCADE, related_name="archived_activities"
+    )
+    location_hint = models.CharField(max_length=200)
+    starts_at = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField()
+    ends_at = models.DateTimeField()
+    helpers_needed = models.PositiveIntegerField()
+    helpers_joined = models.PositiveIntegerField()
+    latitude = latitude_field()
+    longitude = longitude_field()
+    host_email = models.EmailField()
+    host_phone = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=20, choices=Activity.Status.choices)
+    secret_token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "archived activities"
+        ordering = ["-starts_at"]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedJoin(models.Model):
     activity = models.ForeignKey(
-        Activity, on_delete=models.CASCADE, related_name="joins"
+        ArchivedActivity, on_delete=models.CASCADE, related_name="joins"
     )
     session_key = models.CharField(max_length=40)
-    joined_at = models.DateTimeField(auto_now_add=True)
+    joined_at = models.DateTimeField()
 
     class Meta:
         unique_together = ["activity", "session_key"]
@@ -0,0 +1,93 @@
+"""
+"Near me": the nearest live activities to a point, without PostGIS.
+
+A radius search first narrows ``ActivityListing`` rows to the radius's
+latitude/longitude bounding box, which the ``(latitude, longitude)`` index
+answers as a range scan, and only computes great-circle distances for those
+candidates. A listing's coordinates are its activity's pin, or its
+neighborhood's center when the host did not drop one.
+"""
+
+import math
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Activity, ActivityListing
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+LIMIT = 20
+
+
+def parse_point(lat, lng):
+    """Return (lat, lng) as floats, or None if either is missing or out of range."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):  # Also rejects NaN.
+        return None
+    return lat, lng
+
+
+def parse_radius(value):
+    try:
+        radius = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RADIUS_KM
+    return min(max(radius, 0.1), MAX_RADIUS_KM) if math.isfinite(radius) else DEFAULT_RADIUS_KM
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return (min_lat, max_lat, [(min_lng, max_lng), ...]) enclosing the radius.
+
+    A box that crosses the ±180° meridian is split into one longitude range
+    on each side of it.
+    """
+    d_lat = radius_km / KM_PER_DEGREE
+    # Longitude degrees shrink toward the poles; near one, take every longitude.
+    cos_lat = math.cos(math.radians(lat))
+    d_lng = 180 if cos_lat < 0.01 else min(180, radius_km / (KM_PER_DEGREE * cos_lat))
+    west, east = lng - d_lng, lng + d_lng
+    if d_lng >= 180:
+        lng_ranges = [(-180, 180)]
+    elif west < -180:
+        lng_ranges = [(-180, east), (west + 360, 180)]
+    elif east > 180:
+        lng_ranges = [(west, 180), (-180, east - 360)]
+    else:
+        lng_ranges = [(west, east)]
+    return max(-90, lat - d_lat), min(90, lat + d_lat), lng_ranges
+
+
+def nearest(lat, lng, radius_km=DEFAULT_RADIUS_KM, limit=LIMIT, now=None):
+    """Listings of live activities within radius_km of (lat, lng), nearest first.
+
+    Each listing gets a ``distance_km`` attribute.
+    """
+    min_lat, max_lat, lng_ranges = bounding_box(lat, lng, radius_km)
+    in_box = Q()
+    for lng_range in lng_ranges:
+        in_box |= Q(longitude__range=lng_range)
+    candidates = ActivityListing.objects.in_window(
+        Activity.Window.UPCOMING, now or timezone.now()
+    ).filter(in_box, latitude__range=(min_lat, max_lat))
+
+    found = []
+    for listing in candidates:
+        listing.distance_km = distance_km(lat, lng, listing.latitude, listing.longitude)
+        if listing.distance_km <= radius_km:
+            found.append(listing)
+    found.sort(key=lambda listing: (listing.distance_km, listing.starts_at))
+    return found[:limit]
@@ -0,0 +1,151 @@
+"""
+Whole-page cache for the city and neighborhood pages.
+
+These pages are not personalized, so every visitor shares one rendered copy
+per (city slug, neighborhood slug, filter). A view marks how long its page
+stays correct by setting ``response.valid_until`` (the next instant an
+activity enters or leaves the window or a card's time label changes). Writes
+purge the affected pages explicitly through ``purge``. The page's ETag is
+cached with it so a revalidating client gets a 304 without any queries.
+
+Purges only reach the workers that share the cache they are made in. With a
+per-process cache (no ``CACHE_URL``) a purge from one worker or management
+command leaves every other process serving its copy until it expires, so
+``shared`` lets commands and ``check --deploy`` say so.
+"""
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+
+from .models import Activity, Neighborhood
+
+FILTERS = [Activity.Window.NOW, Activity.Window.TODAY, Activity.Window.WEEK]
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+LOCAL_CACHE_WARNING = (
+    "The default cache is per-process (CACHE_URL is not set), so running "
+    "workers keep serving cached pages, search results and counts from before "
+    "this command's changes until they expire."
+)
+
+
+def shared():
+    """Whether invalidations made here reach every process's cache."""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
+
+
+def page_key(city_slug, neighborhood_slug, time_filter):
+    return f"page:{city_slug}:{neighborhood_slug or ''}:{time_filter}"
+
+
+def next_midnight(now):
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timezone.timedelta(days=1)
+
+
+def earliest(*instants):
+    instants = [instant for instant in instants if instant is not None]
+    return min(instants) if instants else None
+
+
+def _timeout(valid_until):
+    max_age = settings.PAGE_CACHE_MAX_AGE
+    if valid_until is None:
+        return max_age
+    return min(max_age, int((valid_until - timezone.now()).total_seconds()))
+
+
+def _cached_response(request, cached):
+    content, etag = cached
+    response = HttpResponse(content)
+    if etag:
+        response.headers["ETag"] = etag
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def _cacheable(response):
+    timeout = _timeout(getattr(response, "valid_until", None))
+    if response.status_code == 200 and timeout > 0:
+        return (response.content, response.headers.get("ETag")), timeout
+    return None, None
+
+
+def cached_page(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, city_slug, neighborhood_slug=None, **kwargs):
+            if neighborhood_slug is not None:
+                kwargs["neighborhood_slug"] = neighborhood_slug
+            time_filter = request.GET.get("filter", "today")
+            if request.method != "GET" or time_filter not in FILTERS:
+                return await view(request, city_slug, **kwargs)
+
+            key = page_key(city_slug, neighborhood_slug, time_filter)
+            cached = await cache.aget(key)
+            if cached is not None:
+                return _cached_response(request, cached)
+
+            response = await view(request, city_slug, **kwargs)
+            value, timeout = _cacheable(response)
+            if value is not None:
+                await cache.aset(key, value, timeout)
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, city_slug, neighborhood_slug=None, **kwargs):
+        if neighborhood_slug is not None:
+            kwargs["neighborhood_slug"] = neighborhood_slug
+        time_filter = request.GET.get("filter", "today")
+        if request.method != "GET" or time_filter not in FILTERS:
+            return view(request, city_slug, **kwargs)
+
+        key = page_key(city_slug, neighborhood_slug, time_filter)
+        cached = cache.get(key)
+        if cached is not None:
+            return _cached_response(request, cached)
+
+        response = view(request, city_slug, **kwargs)
+        value, timeout = _cacheable(response)
+        if value is not None:
+            cache.set(key, value, timeout)
+        return response
+
+    return wrapper
+
+
+def purge(neighborhood_id, include_city=True):
+    slugs = (
+        Neighborhood.objects.filter(pk=neighborhood_id)
+        .values_list("city__slug", "slug")
+        .first()
+    )
+    if slugs is None:
+        return
+    city_slug, neighborhood_slug = slugs
+    keys = [page_key(city_slug, neighborhood_slug, f) for f in FILTERS]
+    if include_city:
+        keys += [page_key(city_slug, None, f) for f in FILTERS]
+    cache.delete_many(keys)
+
+
+def purge_cities(city_slugs, batch_size=500):
+    """Purge the pages of these cities and of every one of their neighborhoods."""
+    city_slugs = list(city_slugs)
+    for start in range(0, len(city_slugs), batch_size):
+        batch = city_slugs[start:start + batch_size]
+        keys = [page_key(slug, None, f) for slug in batch for f in FILTERS]
+        for city_slug, slug in Neighborhood.objects.filter(city__slug__in=batch).values_list(
+            "city__slug", "slug"
+        ):
+            keys += [page_key(city_slug, slug, f) for f in FILTERS]
+        cache.delete_many(keys)
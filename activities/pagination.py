@@ -0,0 +1,54 @@
+"""
+Keyset pagination over activities in (starts_at, id) order.
+
+A cursor names the last card shown, so each page is one index range scan
+(``WHERE (starts_at, id) > cursor ... LIMIT n``), however deep the reader has
+scrolled, unlike OFFSET paging.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(activity):
+    return f"{(activity.starts_at - _EPOCH) // _MICROSECOND}-{activity.pk}"
+
+
+def decode_cursor(value):
+    """Return (starts_at, pk) for a cursor, or None if it is malformed."""
+    try:
+        micros, pk = value.split("-")
+        return _EPOCH + int(micros) * _MICROSECOND, int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+def _query(queryset, after, size):
+    queryset = queryset.order_by("starts_at", "pk")
+    if after is not None:
+        starts_at, pk = after
+        queryset = queryset.filter(
+            Q(starts_at__gt=starts_at) | Q(starts_at=starts_at, pk__gt=pk)
+        )
+    return queryset[:size + 1]
+
+
+def _split(activities, size):
+    if len(activities) > size:
+        return activities[:size], encode_cursor(activities[size - 1])
+    return activities, None
+
+
+def page(queryset, after=None, size=PAGE_SIZE):
+    """Return (activities, next cursor or None) for the page following `after`."""
+    return _split(list(_query(queryset, after, size)), size)
+
+
+async def apage(queryset, after=None, size=PAGE_SIZE):
+    return _split([a async for a in _query(queryset, after, size)], size)
@@ -0,0 +1,17 @@
+"""
+Django's PostgreSQL backend, with connection checkout timed.
+
+Time spent getting a connection (waiting on the pool, or opening a new one
+without it) is charged to the ``connect`` phase of ``activities.timing``, so
+pool saturation shows up per request in ``Server-Timing``.
+"""
+
+from django.db.backends.postgresql import base
+
+from activities.timing import timed
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        with timed("connect"):
+            return super().get_new_connection(conn_params)
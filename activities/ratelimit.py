@@ -0,0 +1,105 @@
+"""
+Token-bucket rate limiting for the write and typeahead endpoints.
+
+``RATE_LIMITS`` maps a URL name to a rate such as ``"20/m"`` (a bucket of 20
+tokens, refilled at 20 per minute), or to ``{"rate": ..., "methods": [...]}``
+to count only some methods. Every matching request takes a token from a
+bucket for the client's IP and, once it has a session cookie, one for the
+session. An empty bucket gets a 429 with ``Retry-After``: a small fragment
+for HTMX requests, a full page otherwise.
+
+Buckets live in Django's default cache, so they only hold across workers
+when that cache is shared (``CACHE_URL``); with the per-process default each
+worker enforces the limit on its own. The check runs in ``process_view``, after URL resolution and before
+the view, and reads only the cache and the session cookie, so a rejected
+request never touches the database. A bucket is read and written without a
+lock; a burst racing across workers can slip a few extra requests through,
+which is fine for abuse control.
+"""
+
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Return (capacity, period seconds) for a rate like "20/m"."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period]
+
+
+def limit_for(url_name, method):
+    """Return (capacity, period) for this URL name and method, or None if unlimited."""
+    limit = getattr(settings, "RATE_LIMITS", {}).get(url_name)
+    if limit is None:
+        return None
+    if isinstance(limit, dict):
+        if method not in limit.get("methods", [method]):
+            return None
+        limit = limit["rate"]
+    return parse_rate(limit)
+
+
+def client_ip(request):
+    if settings.RATE_LIMIT_TRUST_X_FORWARDED_FOR:
+        # The rightmost entry was added by our own proxy; the rest can be forged.
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def take(key, capacity, period, now=None):
+    """Take a token from the bucket at key; return 0, or seconds until one is free."""
+    now = time.time() if now is None else now
+    rate = capacity / period
+    tokens, stamp = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+def check(request, url_name):
+    """Return seconds the client must wait before calling url_name, or 0."""
+    limit = limit_for(url_name, request.method)
+    if limit is None:
+        return 0
+    clients = [("ip", client_ip(request))]
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        clients.append(("session", session_key))
+    for scope, ident in clients:
+        wait = take(f"ratelimit:{url_name}:{scope}:{ident}", *limit)
+        if wait:
+            logger.info("Rate limited %s by %s", url_name, scope, extra={
+                "url_name": url_name, "scope": scope,
+            })
+            return wait
+    return 0
+
+
+def too_many_requests(request, wait):
+    retry_after = math.ceil(wait)
+    template = "components/rate_limited.html" if request.htmx else "rate_limited.html"
+    response = render(request, template, {"retry_after": retry_after}, status=429)
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        wait = check(request, request.resolver_match.url_name)
+        if wait:
+            return too_many_requests(request, wait)
+        return None
@@ -0,0 +1,267 @@
+"""
+Maintained activity counts for the home and city pages.
+
+Counts are stored per neighborhood and time window in ``ActivityCount`` and
+recomputed for a single neighborhood whenever one of its activities changes.
+Because the windows slide with the clock, each row also records the next
+instant its count changes on its own. Once that instant has passed, readers
+recount just those neighborhoods in memory from their activities (``current``)
+and write nothing; ``refresh_expired``, run by ``manage.py sweep_activities``,
+saves the new counts. A page view never scans the whole activities table and
+never takes a write lock.
+
+The home page's city list is also kept in the ``home`` tiered cache family
+(see ``activities.tiered``), invalidated whenever a city's totals change.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from . import tiered
+from .models import Activity, ActivityCount, City, Neighborhood
+
+Window = Activity.Window
+
+HOME = tiered.Family("home", ttl=30, stale=60)
+
+
+def _span(window, starts_at, ends_at):
+    """Return the [enter, leave) instants during which an activity counts.
+
+    Mirrors ``window_bounds``: an activity enters once the window's end
+    reaches its start and leaves when it ends.
+    """
+    if window == Window.NOW:
+        return starts_at, ends_at
+    if window == Window.TODAY:
+        day = timezone.localtime(starts_at)
+        return day.replace(hour=0, minute=0, second=0, microsecond=0), ends_at
+    if window == Window.WEEK:
+        return starts_at - timedelta(days=7), ends_at
+    return None, ends_at
+
+
+def _tally(window, spans, now):
+    count = 0
+    expires_at = None
+    for starts_at, ends_at in spans:
+        enter, leave = _span(window, starts_at, ends_at)
+        if enter is not None and now < enter:
+            change = enter
+        elif now < leave:
+            count += 1
+            change = leave
+        else:
+            continue
+        if expires_at is None or change < expires_at:
+            expires_at = change
+    return count, expires_at
+
+
+def refresh_neighborhood(neighborhood_id, now=None):
+    now = now or timezone.now()
+    with transaction.atomic():
+        neighborhood = (
+            Neighborhood.objects.select_for_update()
+            .filter(pk=neighborhood_id)
+            .first()
+        )
+        ActivityCount.objects.filter(neighborhood_id=neighborhood_id).delete()
+        if neighborhood is None:
+            return
+
+        spans = list(
+            Activity.objects.active()
+            .filter(neighborhood_id=neighborhood_id, ends_at__gt=now)
+            .values_list("starts_at", "ends_at")
+        )
+        rows = []
+        for window in Window:
+            count, expires_at = _tally(window, spans, now)
+            if count or expires_at:
+                rows.append(ActivityCount(
+                    city_id=neighborhood.city_id,
+                    neighborhood_id=neighborhood_id,
+                    window=window,
+                    count=count,
+                    expires_at=expires_at,
+                ))
+        ActivityCount.objects.bulk_create(rows)
+        refresh_city(neighborhood.city_id)
+
+
+def refresh_city(city_id):
+    with transaction.atomic():
+        locked = City.objects.select_for_update().filter(pk=city_id)
+        city_exists = bool(list(locked.values_list("pk", flat=True)))
+        ActivityCount.objects.filter(city_id=city_id, neighborhood__isnull=True).delete()
+        if not city_exists:
+            return
+
+        totals = (
+            ActivityCount.objects.filter(city_id=city_id, neighborhood__isnull=False)
+            .values("window")
+            .annotate(total=Sum("count"), next_change=Min("expires_at"))
+        )
+        ActivityCount.objects.bulk_create([
+            ActivityCount(
+                city_id=city_id,
+                window=row["window"],
+                count=row["total"],
+                expires_at=row["next_change"],
+            )
+            for row in totals
+        ])
+    transaction.on_commit(invalidate_city_list)
+
+
+def rebuild(now=None):
+    now = now or timezone.now()
+    ActivityCount.objects.all().delete()
+    neighborhood_ids = (
+        Activity.objects.active()
+        .filter(ends_at__gt=now)
+        .order_by()
+        .values_list("neighborhood_id", flat=True)
+        .distinct()
+    )
+    for neighborhood_id in list(neighborhood_ids):
+        refresh_neighborhood(neighborhood_id, now)
+
+
+def refresh_expired(now=None):
+    """Recompute every neighborhood whose counts have expired; return how many."""
+    now = now or timezone.now()
+    expired = set(
+        ActivityCount.objects.filter(neighborhood__isnull=False, expires_at__lte=now)
+        .values_list("neighborhood_id", flat=True)
+    )
+    for neighborhood_id in expired:
+        refresh_neighborhood(neighborhood_id, now)
+    return len(expired)
+
+
+def _expired(row, now):
+    return row.expires_at is not None and row.expires_at <= now
+
+
+def current(rows, now):
+    """Return the neighborhood rows with any expired count recomputed in memory."""
+    rows = list(rows)
+    expired = {row.neighborhood_id for row in rows if _expired(row, now)}
+    if not expired:
+        return rows
+    spans = defaultdict(list)
+    for neighborhood_id, starts_at, ends_at in (
+        Activity.objects.active()
+        .filter(neighborhood_id__in=expired, ends_at__gt=now)
+        .values_list("neighborhood_id", "starts_at", "ends_at")
+    ):
+        spans[neighborhood_id].append((starts_at, ends_at))
+    for row in rows:
+        if row.neighborhood_id in expired:
+            row.count, row.expires_at = _tally(row.window, spans[row.neighborhood_id], now)
+    return rows
+
+
+def _neighborhood_rows(window, now, **filters):
+    """Rows that may count for window: positive ones and any due for a recount."""
+    return ActivityCount.objects.filter(
+        Q(count__gt=0) | Q(expires_at__lte=now),
+        window=window,
+        neighborhood__isnull=False,
+        **filters,
+    )
+
+
+def city_counts(window, now=None):
+    """Map city id to its live activity count for window."""
+    now = now or timezone.now()
+    counts = {}
+    stale = []
+    for row in ActivityCount.objects.filter(window=window, neighborhood__isnull=True):
+        if _expired(row, now):
+            stale.append(row.city_id)
+        else:
+            counts[row.city_id] = row.count
+    if stale:
+        for row in current(_neighborhood_rows(window, now, city_id__in=stale), now):
+            counts[row.city_id] = counts.get(row.city_id, 0) + row.count
+    return {city_id: count for city_id, count in counts.items() if count}
+
+
+def city_list(window, now=None):
+    """Return every city annotated with activity_count for window, cached."""
+    def compute():
+        counts = city_counts(window, now)
+        cities = list(City.objects.all())
+        for city in cities:
+            city.activity_count = counts.get(city.pk, 0)
+        return cities
+
+    return HOME.fetch(window, compute)
+
+
+def invalidate_city_list():
+    HOME.invalidate(*Window)
+
+
+def next_change(window, city_id, neighborhood_id=None, now=None):
+    """Return when the count for a city (or one of its neighborhoods) next changes."""
+    now = now or timezone.now()
+    rows = ActivityCount.objects.filter(city_id=city_id, window=window)
+    if neighborhood_id is not None:
+        rows = rows.filter(neighborhood_id=neighborhood_id)
+    rows = list(rows)
+    summary = next((row for row in rows if row.neighborhood_id == neighborhood_id), None)
+    if summary is None:
+        return None
+    if not _expired(summary, now):
+        return summary.expires_at
+    # The summary holds the earliest neighborhood change, so only recount once it has passed.
+    neighborhoods = current([row for row in rows if row.neighborhood_id is not None], now)
+    return min(
+        (row.expires_at for row in neighborhoods if row.expires_at is not None),
+        default=None,
+    )
+
+
+def count_maps(window, city_ids, neighborhood_ids, now=None):
+    """Return ({city id: count}, {neighborhood id: count}) for window, for just these ids."""
+    now = now or timezone.now()
+    city_ids = set(city_ids)
+    rows = _neighborhood_rows(window, now).filter(
+        Q(city_id__in=city_ids) | Q(neighborhood_id__in=neighborhood_ids)
+    )
+    city_map = {}
+    neighborhood_map = {}
+    for row in current(rows, now):
+        if row.count:
+            if row.city_id in city_ids:
+                city_map[row.city_id] = city_map.get(row.city_id, 0) + row.count
+            neighborhood_map[row.neighborhood_id] = row.count
+    return city_map, neighborhood_map
+
+
+def neighborhood_counts(city, window, now=None):
+    """Return the city's neighborhoods with live activities, annotated with activity_count."""
+    now = now or timezone.now()
+    rows = current(
+        _neighborhood_rows(window, now, city=city)
+        .select_related("neighborhood")
+        .order_by("neighborhood__name"),
+        now,
+    )
+    neighborhoods = []
+    for row in rows:
+        if not row.count:
+            continue
+        neighborhood = row.neighborhood
+        neighborhood.city = city
+        neighborhood.activity_count = row.count
+        neighborhoods.append(neighborhood)
+    return neighborhoods
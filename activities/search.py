@@ -0,0 +1,243 @@
+"""
+In-process typeahead index for the location search box.
+
+The location directory is a few hundred cities and neighborhoods and rarely
+changes, so each worker keeps a prefix and trigram index of the names in
+memory and answers ``search_locations`` without touching those tables.
+Matches are ranked by how well they match (exact, prefix, word prefix,
+substring, then trigram similarity for typos) and then by live activity
+count, which comes from the ``ActivityCount`` rollup rows of just the
+matched cities and neighborhoods.
+
+The index is rebuilt lazily after a ``City`` or ``Neighborhood`` change. The
+change bumps a version stored in the cache so other workers notice when the
+cache is shared, and every worker also rebuilds after ``MAX_AGE`` as a
+fallback for per-process caches.
+
+Rendered result fragments are cached per normalized query and
+``SEARCH_CACHE_TTL`` time bucket, under a generation number that is bumped
+whenever activity counts or locations change.
+"""
+
+import copy
+import hashlib
+import re
+import secrets
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from . import rollups
+from .models import Activity, City, Neighborhood
+
+VERSION_KEY = "search:location-index-version"
+GENERATION_KEY = "search:results-generation"
+HITS_KEY = "search:results-hits"
+MISSES_KEY = "search:results-misses"
+MAX_AGE = 300
+MIN_SIMILARITY = 0.5
+
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = 4, 3, 2, 1
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class LocationIndex:
+    """Immutable snapshot of searchable city and neighborhood names."""
+
+    def __init__(self, cities, neighborhoods):
+        self.entries = []
+        self.prefixes = defaultdict(set)
+        self.grams = defaultdict(set)
+        for city in cities:
+            self._add(city, [city.name, city.state])
+        for neighborhood in neighborhoods:
+            self._add(neighborhood, [neighborhood.name])
+
+    def _add(self, obj, names):
+        entry_id = len(self.entries)
+        texts = [normalize(name) for name in names]
+        self.entries.append((obj, texts, [trigrams(text) for text in texts]))
+        for text in texts:
+            for word in text.split():
+                for end in range(1, len(word) + 1):
+                    self.prefixes[word[:end]].add(entry_id)
+            for gram in trigrams(text):
+                self.grams[gram].add(entry_id)
+
+    def _candidates(self, tokens, query_grams):
+        found = set.intersection(*(self.prefixes.get(token, set()) for token in tokens))
+        for gram in query_grams:
+            found |= self.grams.get(gram, set())
+        return found
+
+    @staticmethod
+    def _score(query, tokens, query_grams, texts, text_grams):
+        best = 0
+        for text, grams in zip(texts, text_grams):
+            words = text.split()
+            if text == query:
+                return EXACT
+            elif text.startswith(query):
+                score = PREFIX
+            elif all(any(word.startswith(token) for word in words) for token in tokens):
+                score = WORD_PREFIX
+            elif query in text:
+                score = SUBSTRING
+            elif query_grams:
+                similarity = len(query_grams & grams) / len(query_grams)
+                score = similarity if similarity >= MIN_SIMILARITY else 0
+            else:
+                score = 0
+            best = max(best, score)
+        return best
+
+    def search(self, query):
+        """Return [(score, obj)] for every entry matching query."""
+        query = normalize(query)
+        tokens = query.split()
+        if not tokens:
+            return []
+        query_grams = trigrams(query) if len(query) >= 3 else set()
+
+        matches = []
+        for entry_id in self._candidates(tokens, query_grams):
+            obj, texts, text_grams = self.entries[entry_id]
+            score = self._score(query, tokens, query_grams, texts, text_grams)
+            if score:
+                matches.append((score, obj))
+        return matches
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_built_at = 0.0
+
+
+def build_index():
+    cities = {city.pk: city for city in City.objects.all()}
+    neighborhoods = list(Neighborhood.objects.all())
+    for neighborhood in neighborhoods:
+        neighborhood.city = cities[neighborhood.city_id]
+    return LocationIndex(cities.values(), neighborhoods)
+
+
+def get_index():
+    global _index, _index_version, _built_at
+    version = cache.get(VERSION_KEY)
+    index = _index
+    if index is not None and version == _index_version and time.monotonic() - _built_at < MAX_AGE:
+        return index
+    with _lock:
+        if _index is index:
+            _index = build_index()
+            _index_version = version
+            _built_at = time.monotonic()
+        return _index
+
+
+def warm_index():
+    """Build the index at worker start; leave it lazy if the tables are missing."""
+    try:
+        get_index()
+    except DatabaseError:
+        pass
+
+
+def invalidate_index():
+    global _index
+    cache.set(VERSION_KEY, secrets.token_hex(8), None)
+    _index = None
+    invalidate_results()
+
+
+def find_locations(query, city_limit=10, neighborhood_limit=15):
+    """Return (cities, neighborhoods) matching query, annotated with activity_count."""
+    matches = get_index().search(query)
+    if not matches:
+        return [], []
+
+    city_counts, neighborhood_counts = rollups.count_maps(
+        Activity.Window.UPCOMING,
+        [obj.pk for _, obj in matches if isinstance(obj, City)],
+        [obj.pk for _, obj in matches if not isinstance(obj, City)],
+    )
+    cities = []
+    neighborhoods = []
+    for score, obj in matches:
+        obj = copy.copy(obj)
+        if isinstance(obj, City):
+            obj.activity_count = city_counts.get(obj.pk, 0)
+            cities.append((score, obj))
+        else:
+            obj.activity_count = neighborhood_counts.get(obj.pk, 0)
+            neighborhoods.append((score, obj))
+
+    def rank(match):
+        score, obj = match
+        return -score, -obj.activity_count, obj.name
+
+    cities = [obj for _, obj in sorted(cities, key=rank)[:city_limit]]
+    neighborhoods = [obj for _, obj in sorted(neighborhoods, key=rank)[:neighborhood_limit]]
+    return cities, neighborhoods
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def results_cache_key(query):
+    generation = cache.get(GENERATION_KEY, 0)
+    bucket = int(time.time() // settings.SEARCH_CACHE_TTL)
+    digest = hashlib.md5(normalize(query).encode()).hexdigest()
+    return f"search:results:{generation}:{bucket}:{digest}"
+
+
+def get_cached_results(key):
+    content = cache.get(key)
+    _incr(MISSES_KEY if content is None else HITS_KEY)
+    return content
+
+
+def cache_results(key, content):
+    cache.set(key, content, settings.SEARCH_CACHE_TTL)
+
+
+def invalidate_results():
+    _incr(GENERATION_KEY)
+
+
+def results_cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "ttl": settings.SEARCH_CACHE_TTL,
+    }
+
+
+def reset_results_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,26 @@
+"""
+cached_db session store that reports its load and save time to
+``activities.timing``. Use it as ``SESSION_ENGINE = "activities.sessions"``.
+"""
+
+from django.contrib.sessions.backends import cached_db
+
+from .timing import timed
+
+
+class SessionStore(cached_db.SessionStore):
+    def load(self):
+        with timed("session_load"):
+            return super().load()
+
+    def save(self, must_create=False):
+        with timed("session_save"):
+            return super().save(must_create)
+
+    async def aload(self):
+        with timed("session_load"):
+            return await super().aload()
+
+    async def asave(self, must_create=False):
+        with timed("session_save"):
+            return await super().asave(must_create)
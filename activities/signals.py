@@ -0,0 +1,77 @@
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import dbpool, listings, live, pagecache, rollups, search
+from .models import Activity, City, Neighborhood
+
+# Saves limited to other fields (e.g. helpers_joined) cannot change a count.
+ROLLUP_FIELDS = {"neighborhood", "starts_at", "ends_at", "status"}
+
+
+def _refresh_neighborhoods(*neighborhood_ids):
+    for neighborhood_id in set(filter(None, neighborhood_ids)):
+        transaction.on_commit(
+            lambda pk=neighborhood_id: rollups.refresh_neighborhood(pk)
+        )
+    transaction.on_commit(search.invalidate_results)
+
+
+def _purge_pages(neighborhood_ids, include_city):
+    for neighborhood_id in set(filter(None, neighborhood_ids)):
+        transaction.on_commit(
+            lambda pk=neighborhood_id: pagecache.purge(pk, include_city)
+        )
+
+
+@receiver(post_save, sender=Activity)
+def activity_saved(sender, instance, update_fields=None, **kwargs):
+    neighborhood_ids = [
+        instance.neighborhood_id,
+        getattr(instance, "_loaded_neighborhood_id", None),
+    ]
+    instance._loaded_neighborhood_id = instance.neighborhood_id
+    # Before the page purges, so a re-rendered page reads the new listing.
+    transaction.on_commit(lambda: listings.refresh([instance.pk]))
+    counts_changed = update_fields is None or ROLLUP_FIELDS.intersection(update_fields)
+    if counts_changed:
+        _refresh_neighborhoods(*neighborhood_ids)
+    _purge_pages(neighborhood_ids, include_city=bool(counts_changed))
+    event = live.event_for(instance)
+    transaction.on_commit(lambda: live.publish(event))
+
+
+@receiver(post_delete, sender=Activity)
+def activity_deleted(sender, instance, **kwargs):
+    _refresh_neighborhoods(instance.neighborhood_id)
+    _purge_pages([instance.neighborhood_id], include_city=True)
+
+
+@receiver(post_delete, sender=Neighborhood)
+def neighborhood_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: rollups.refresh_city(instance.city_id))
+
+
+@receiver(post_save, sender=Neighborhood)
+def neighborhood_saved(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: listings.refresh_neighborhood(instance.pk))
+
+
+@receiver(post_save, sender=City)
+def city_saved(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: listings.refresh_city(instance.pk))
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Neighborhood)
+@receiver(post_delete, sender=Neighborhood)
+def location_changed(sender, **kwargs):
+    transaction.on_commit(search.invalidate_index)
+    transaction.on_commit(rollups.invalidate_city_list)
+
+
+request_finished.connect(dbpool.maybe_report, dispatch_uid="activities.dbpool")
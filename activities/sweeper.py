@@ -0,0 +1,42 @@
+"""
+Completion of activities whose time has passed.
+
+Hosts rarely click "complete", so ``sweep`` marks active activities that have
+ended as completed, in chunked UPDATEs with one short transaction each. It is
+idempotent and each UPDATE re-checks the status, so overlapping runs (say a
+slow cron job and the next one) are harmless.
+
+No signals are needed: an ended activity is already outside every rollup
+window and cached page, and bumping ``updated_at`` changes its detail ETag.
+Each batch drops the activities' listings directly.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import listings
+from .models import Activity
+
+
+def sweep_batch(now, batch_size=1000):
+    """Complete up to batch_size ended activities; return how many changed."""
+    with transaction.atomic():
+        ids = list(
+            Activity.objects.active()
+            .filter(ends_at__lte=now)
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        listings.remove(ids)
+        return Activity.objects.active().filter(pk__in=ids).update(
+            status=Activity.Status.COMPLETED, updated_at=timezone.now()
+        )
+
+
+def sweep(now=None, batch_size=1000):
+    now = now or timezone.now()
+    total = 0
+    while moved := sweep_batch(now, batch_size):
+        total += moved
+    return total
@@ -1,3 +1,1284 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import archive, cards, checks, conditional, dbpool, feeds, geography, joining, ledger, listings, live, nearby, pagecache, pagination, ratelimit, rollups, search, sweeper, tiered
+from .budget import QueryBudgetExceeded, QueryBudgetMiddleware, QueryStats
+from .models import (
+    RESERVED_CITY_SLUGS, City, Neighborhood, Activity, ActivityCount, ActivityJoin, ActivityListing, ArchivedActivity,
+)
+
+
+def make_activity(neighborhood, **kwargs):
+    fields = {
+        "title": "Garden cleanup",
+        "description": "Pulling weeds",
+        "neighborhood": neighborhood,
+        "location_hint": "Near the park",
+        "starts_at": timezone.now() + timedelta(hours=1),
+        "host_email": "host@example.com",
+    }
+    fields.update(kwargs)
+    return Activity.objects.create(**fields)
+
+
+@override_settings(QUERY_BUDGET_MODE="raise")
+class BarnRaiseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(name="Austin", state="Texas", slug="austin")
+        cls.neighborhood = Neighborhood.objects.create(
+            city=cls.city, name="Mueller", slug="mueller"
+        )
+        cls.other = Neighborhood.objects.create(
+            city=cls.city, name="Zilker", slug="zilker"
+        )
+
+    def setUp(self):
+        cache.clear()
+        tiered.clear_local()
+        search.invalidate_index()
+
+    def create_activity(self, neighborhood=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_activity(neighborhood or self.neighborhood, **kwargs)
+
+
+class ActivityCountRollupTests(BarnRaiseTestCase):
+    def count(self, window, neighborhood=None):
+        row = ActivityCount.objects.filter(
+            city=self.city, neighborhood=neighborhood, window=window
+        ).first()
+        return row.count if row else 0
+
+    def test_saving_activity_updates_neighborhood_and_city(self):
+        self.create_activity()
+        self.create_activity(neighborhood=self.other)
+
+        self.assertEqual(self.count("upcoming", self.neighborhood), 1)
+        self.assertEqual(self.count("upcoming"), 2)
+        self.assertEqual(self.count("week"), 2)
+
+    def test_status_change_removes_activity_from_counts(self):
+        activity = self.create_activity()
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.status = Activity.Status.CANCELLED
+            activity.save(update_fields=["status"])
+
+        self.assertEqual(self.count("upcoming"), 0)
+
+    def test_moving_activity_refreshes_both_neighborhoods(self):
+        activity = Activity.objects.get(pk=self.create_activity().pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.neighborhood = self.other
+            activity.save()
+
+        self.assertEqual(self.count("upcoming", self.neighborhood), 0)
+        self.assertEqual(self.count("upcoming", self.other), 1)
+
+    def test_counts_roll_forward_when_window_expires(self):
+        self.create_activity(starts_at=timezone.now() + timedelta(days=8))
+        now = timezone.now()
+
+        self.assertEqual(rollups.city_counts("week", now), {})
+        later = now + timedelta(days=2)
+        self.assertEqual(rollups.city_counts("week", later), {self.city.pk: 1})
+        gone = now + timedelta(days=9)
+        self.assertEqual(rollups.city_counts("week", gone), {})
+
+    def test_reads_recount_expired_windows_without_writing(self):
+        self.create_activity(starts_at=timezone.now() + timedelta(days=8))
+        later = timezone.now() + timedelta(days=2)
+        stored = list(ActivityCount.objects.values_list("window", "count", "expires_at"))
+
+        self.assertEqual(rollups.city_counts("week", later), {self.city.pk: 1})
+        self.assertEqual(
+            rollups.count_maps("week", [self.city.pk], [self.neighborhood.pk], later),
+            ({self.city.pk: 1}, {self.neighborhood.pk: 1}),
+        )
+        self.assertEqual(
+            [n.activity_count for n in rollups.neighborhood_counts(self.city, "week", later)], [1]
+        )
+        self.assertGreater(rollups.next_change("week", self.city.pk, now=later), later)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            response = self.client.get(self.city.get_absolute_url(), {"filter": "week"})
+            self.assertEqual(len(response.context["neighborhoods"]), 1)
+            self.assertEqual(self.client.get(reverse("home")).status_code, 200)
+            response = self.client.get(self.neighborhood.get_absolute_url(), {"filter": "week"})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(ActivityCount.objects.values_list("window", "count", "expires_at")), stored
+        )
+
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            call_command("sweep_activities", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self.count("week"), 1)
+        self.assertEqual(rollups.refresh_expired(later), 0)
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.create_activity()
+        self.create_activity(neighborhood=self.other)
+        before = set(ActivityCount.objects.values_list("neighborhood", "window", "count"))
+
+        rollups.rebuild()
+
+        after = set(ActivityCount.objects.values_list("neighborhood", "window", "count"))
+        self.assertEqual(before, after)
+
+    def test_pages_read_from_rollup(self):
+        self.create_activity()
+
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["cities"][0].activity_count, 1)
+
+        response = self.client.get(self.city.get_absolute_url())
+        self.assertEqual(
+            [n.name for n in response.context["neighborhoods"]], ["Mueller"]
+        )
+
+
+class ActivityWindowTests(BarnRaiseTestCase):
+    def test_ends_at_follows_start_and_duration(self):
+        activity = self.create_activity(duration_minutes=90)
+        self.assertEqual(activity.ends_at, activity.starts_at + timedelta(minutes=90))
+
+        activity.duration_minutes = 30
+        activity.save(update_fields=["duration_minutes"])
+        activity.refresh_from_db()
+        self.assertEqual(activity.ends_at, activity.starts_at + timedelta(minutes=30))
+
+    def test_now_window_uses_exact_overlap(self):
+        now = timezone.now()
+        running = self.create_activity(
+            starts_at=now - timedelta(hours=5), duration_minutes=360
+        )
+        self.create_activity(starts_at=now - timedelta(hours=3), duration_minutes=60)
+        self.create_activity(starts_at=now + timedelta(minutes=5))
+
+        self.assertEqual(
+            list(Activity.objects.active().in_window("now", now)), [running]
+        )
+
+    def test_week_window_excludes_far_future(self):
+        now = timezone.now()
+        soon = self.create_activity(starts_at=now + timedelta(days=2))
+        self.create_activity(starts_at=now + timedelta(days=8))
+
+        self.assertEqual(list(Activity.objects.in_window("week", now)), [soon])
+        self.assertEqual(Activity.objects.in_window("upcoming", now).count(), 2)
+
+
+class JoinActivityTests(BarnRaiseTestCase):
+    def test_join_is_idempotent_per_session(self):
+        activity = self.create_activity(helpers_needed=3)
+
+        self.assertEqual(joining.join_activity(activity.pk, "abc"), joining.JOINED)
+        self.assertEqual(joining.join_activity(activity.pk, "abc"), joining.ALREADY_JOINED)
+
+        activity.refresh_from_db()
+        self.assertEqual(activity.helpers_joined, 1)
+        self.assertEqual(activity.joins.count(), 1)
+
+    def test_join_respects_capacity_and_status(self):
+        activity = self.create_activity(helpers_needed=1)
+        joining.join_activity(activity.pk, "first")
+
+        self.assertEqual(joining.join_activity(activity.pk, "second"), joining.FULL)
+        self.assertFalse(activity.joins.filter(session_key="second").exists())
+
+        Activity.objects.filter(pk=activity.pk).update(
+            status=Activity.Status.CANCELLED, helpers_needed=5
+        )
+        self.assertEqual(joining.join_activity(activity.pk, "third"), joining.CLOSED)
+
+    def test_other_integrity_errors_are_not_reported_as_joined(self):
+        activity = self.create_activity()
+        with mock.patch.object(
+            ActivityJoin.objects, "create", side_effect=IntegrityError("FOREIGN KEY constraint failed")
+        ):
+            self.assertEqual(joining.join_activity(activity.pk, "abc"), joining.CLOSED)
+
+    def test_htmx_join_renders_button(self):
+        activity = self.create_activity()
+
+        response = self.client.post(
+            reverse("activity_join", args=[activity.pk]), HTTP_HX_REQUEST="true"
+        )
+        self.assertContains(response, "You're going!")
+
+
+class ConcurrentJoinTests(TransactionTestCase):
+    joiners = 40
+
+    def test_flash_crowd_never_loses_or_overbooks_joins(self):
+        city = City.objects.create(name="Austin", state="Texas", slug="austin")
+        neighborhood = Neighborhood.objects.create(city=city, name="Mueller", slug="mueller")
+        activity = make_activity(neighborhood, helpers_needed=15)
+
+        def join(i):
+            try:
+                # Every other joiner double-submits.
+                return [
+                    joining.join_activity(activity.pk, f"session-{i // 2}")
+                    for _ in range(2)
+                ]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = [r for pair in pool.map(join, range(self.joiners)) for r in pair]
+
+        activity.refresh_from_db()
+        self.assertEqual(activity.helpers_joined, 15)
+        self.assertEqual(ActivityJoin.objects.filter(activity=activity).count(), 15)
+        self.assertEqual(results.count(joining.JOINED), 15)
+        self.assertEqual(results.count(joining.FULL), 5 * 4)
+
+
+class LocationSearchTests(BarnRaiseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stl = City.objects.create(name="St. Louis City", state="Missouri", slug="st-louis-city")
+        for name in ["Benton Park", "Benton Park West", "Lafayette Square", "Soulard"]:
+            Neighborhood.objects.create(city=cls.stl, name=name, slug=name.lower().replace(" ", "-"))
+
+    def names(self, query):
+        cities, neighborhoods = search.find_locations(query)
+        return [c.name for c in cities], [n.name for n in neighborhoods]
+
+    def test_ranks_prefix_matches_before_substrings(self):
+        cities, neighborhoods = self.names("st")
+        self.assertEqual(cities, ["St. Louis City"])
+        self.assertEqual(neighborhoods, [])
+
+        self.assertEqual(self.names("park")[1], ["Benton Park", "Benton Park West"])
+        self.assertEqual(self.names("benton park w")[1][0], "Benton Park West")
+
+    def test_counts_are_read_for_matches_only(self):
+        soulard = Neighborhood.objects.get(name="Soulard")
+        self.create_activity(neighborhood=soulard)
+        self.create_activity()
+
+        self.assertEqual(
+            rollups.count_maps("upcoming", [], [soulard.pk]), ({}, {soulard.pk: 1})
+        )
+        self.assertEqual(
+            rollups.count_maps("upcoming", [self.city.pk], []),
+            ({self.city.pk: 1}, {self.neighborhood.pk: 1}),
+        )
+
+    def test_tolerates_minor_typos(self):
+        self.assertEqual(self.names("bentn")[1][:2], ["Benton Park", "Benton Park West"])
+        self.assertEqual(self.names("lafayete")[1], ["Lafayette Square"])
+
+    def test_activity_count_breaks_ties(self):
+        west = Neighborhood.objects.get(name="Benton Park West")
+        self.create_activity(neighborhood=west)
+
+        self.assertEqual(self.names("benton")[1], ["Benton Park West", "Benton Park"])
+
+    def test_rebuilds_after_location_changes(self):
+        self.assertEqual(self.names("hyde")[1], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Neighborhood.objects.create(city=self.stl, name="Hyde Park", slug="hyde-park")
+
+        self.assertEqual(self.names("hyde")[1], ["Hyde Park"])
+
+    def test_search_view_does_not_query_location_tables(self):
+        search.get_index()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("search_locations"), {"q": "soul"})
+        self.assertContains(response, "Soulard")
+
+
+class SearchResultsCacheTests(BarnRaiseTestCase):
+    def search(self, query):
+        return self.client.get(reverse("search_locations"), {"q": query})
+
+    def test_repeat_query_is_served_from_cache(self):
+        first = self.search("Muel")
+        with self.assertNumQueries(0):
+            second = self.search("  muel ")
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(search.results_cache_stats()["hits"], 1)
+        self.assertEqual(search.results_cache_stats()["misses"], 1)
+
+    def test_posting_activity_invalidates_cached_counts(self):
+        self.assertNotContains(self.search("muel"), "bg-barn-600")
+        self.create_activity()
+
+        self.assertContains(self.search("muel"), "bg-barn-600")
+
+
+class PageCacheTests(BarnRaiseTestCase):
+    def neighborhood_page(self, **params):
+        return self.client.get(self.neighborhood.get_absolute_url(), params)
+
+    def test_neighborhood_page_is_served_from_cache(self):
+        self.create_activity(title="Plant tomatoes")
+        self.neighborhood_page()
+
+        with self.assertNumQueries(0):
+            response = self.neighborhood_page()
+        self.assertContains(response, "Plant tomatoes")
+
+    def test_activity_edit_purges_pages(self):
+        activity = self.create_activity(title="Plant tomatoes")
+        self.neighborhood_page(filter="week")
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.title = "Plant peppers"
+            activity.save()
+
+        self.assertContains(self.neighborhood_page(filter="week"), "Plant peppers")
+
+    def test_join_purges_neighborhood_page(self):
+        activity = self.create_activity(helpers_needed=4)
+        self.assertContains(self.neighborhood_page(), ">0</span>/4 helpers")
+
+        self.client.post(reverse("activity_join", args=[activity.pk]))
+        self.assertContains(self.neighborhood_page(), ">1</span>/4 helpers")
+
+    def test_page_expires_when_window_changes(self):
+        starts_at = timezone.now() + timedelta(minutes=10)
+        self.create_activity(starts_at=starts_at)
+
+        response = self.neighborhood_page(filter="now")
+        self.assertEqual(response.valid_until, starts_at)
+        self.assertIsNotNone(cache.get(pagecache.page_key("austin", "mueller", "now")))
+
+
+class ConditionalGetTests(BarnRaiseTestCase):
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_activity_detail_answers_304_until_it_changes(self):
+        activity = self.create_activity(helpers_needed=3)
+        url = activity.get_absolute_url()
+        first = self.client.get(url)
+        self.assertIn("Last-Modified", first)
+
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        joining.join_activity(activity.pk, "someone-else")
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_activity_last_modified_rolls_over_at_local_midnight(self):
+        activity = self.create_activity(starts_at=timezone.now() - timedelta(days=10))
+        midnight = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) + timedelta(days=2)
+        before_midnight = http_date((midnight - timedelta(minutes=30)).timestamp())
+
+        now = (midnight + timedelta(hours=1)).astimezone(dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            response = self.client.get(
+                activity.get_absolute_url(), HTTP_IF_MODIFIED_SINCE=before_midnight
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Last-Modified"], http_date(midnight.timestamp()))
+
+    def test_neighborhood_page_revalidates_from_cached_etag(self):
+        self.create_activity()
+        url = self.neighborhood.get_absolute_url()
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+    def test_etags_change_when_places_are_renamed(self):
+        self.create_activity()
+        request = RequestFactory().get("/")
+        before = (
+            conditional.city_etag(request, "austin"),
+            conditional.neighborhood_etag(request, "austin", "mueller"),
+        )
+
+        Neighborhood.objects.filter(pk=self.neighborhood.pk).update(name="Mueller Park")
+        city_etag = conditional.city_etag(request, "austin")
+        neighborhood_etag = conditional.neighborhood_etag(request, "austin", "mueller")
+        self.assertNotEqual(city_etag, before[0])
+        self.assertNotEqual(neighborhood_etag, before[1])
+
+        City.objects.filter(pk=self.city.pk).update(name="Austin City")
+        self.assertNotEqual(conditional.city_etag(request, "austin"), city_etag)
+        self.assertNotEqual(
+            conditional.neighborhood_etag(request, "austin", "mueller"), neighborhood_etag
+        )
+
+    def test_city_etag_changes_with_counts(self):
+        url = self.city.get_absolute_url()
+        first = self.client.get(url, {"filter": "week"})
+        cache.clear()
+        self.assertEqual(self.revalidate(url, first, filter="week").status_code, 304)
+
+        self.create_activity()
+        cache.clear()
+        self.assertEqual(self.revalidate(url, first, filter="week").status_code, 200)
+
+
+class SessionCostTests(BarnRaiseTestCase):
+    def writes(self, queries):
+        return [q["sql"] for q in queries if not q["sql"].startswith("SELECT")]
+
+    def test_viewing_activity_creates_no_session(self):
+        activity = self.create_activity()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(activity.get_absolute_url())
+
+        self.assertEqual(self.writes(queries), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_joining_creates_session_then_reads_are_write_free(self):
+        activity = self.create_activity(helpers_needed=2)
+        self.client.post(reverse("activity_join", args=[activity.pk]))
+        self.assertIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(activity.get_absolute_url())
+
+        self.assertTrue(response.context["has_joined"])
+        self.assertEqual(self.writes(queries), [])
+        self.assertFalse(any("django_session" in q["sql"] for q in queries))
+
+
+class JoinLedgerTests(BarnRaiseTestCase):
+    def join(self, activity):
+        return self.client.post(reverse("activity_join", args=[activity.pk]))
+
+    def detail_join_queries(self, activity):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(activity.get_absolute_url())
+        joins = [q for q in queries if "activities_activityjoin" in q["sql"]]
+        return response.context["has_joined"], len(joins)
+
+    def test_joined_state_comes_from_ledger(self):
+        joined = self.create_activity(helpers_needed=2)
+        other = self.create_activity(helpers_needed=2)
+        self.join(joined)
+
+        self.assertEqual(self.detail_join_queries(joined), (True, 0))
+        self.assertEqual(self.detail_join_queries(other), (False, 0))
+
+    def test_ledger_does_not_carry_the_session_key(self):
+        self.join(self.create_activity())
+        session_key = self.client.session.session_key
+
+        self.assertNotIn(session_key, self.client.cookies[ledger.COOKIE_NAME].value)
+
+    def test_tampered_ledger_falls_back_to_database(self):
+        activity = self.create_activity(helpers_needed=2)
+        self.join(activity)
+        self.client.cookies[ledger.COOKIE_NAME] = "forged"
+
+        self.assertEqual(self.detail_join_queries(activity), (True, 2))
+
+    def test_truncated_ledger_falls_back_to_database(self):
+        activities = [self.create_activity(helpers_needed=2) for _ in range(3)]
+        with mock.patch.object(ledger, "MAX_ENTRIES", 2):
+            for activity in activities:
+                self.join(activity)
+
+            self.assertEqual(self.detail_join_queries(activities[2]), (True, 0))
+            self.assertEqual(self.detail_join_queries(activities[0]), (True, 2))
+
+
+class QueryBudgetTests(BarnRaiseTestCase):
+    def test_every_page_stays_within_budget(self):
+        activity = self.create_activity(helpers_needed=3)
+        urls = [
+            reverse("home"),
+            self.city.get_absolute_url(),
+            self.neighborhood.get_absolute_url(),
+            activity.get_absolute_url(),
+            reverse("activity_directions", args=[activity.pk]),
+            reverse("activity_post"),
+            activity.get_manage_url(),
+        ]
+        # Budgets are enforced by the middleware in "raise" mode.
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertLess(self.client.get(url).status_code, 400)
+        self.client.post(reverse("activity_join", args=[activity.pk]))
+        self.client.get(reverse("search_locations"), {"q": "mueller"})
+
+    def test_regression_fails_the_request(self):
+        activity = self.create_activity()
+        url = reverse("activity_directions", args=[activity.pk])
+
+        with override_settings(QUERY_BUDGETS={"activity_directions": 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "activity_directions ran 1"):
+                self.client.get(url)
+
+    def test_log_mode_only_warns(self):
+        with override_settings(QUERY_BUDGET_MODE="log", QUERY_BUDGETS={"home": 0}):
+            with self.assertLogs("activities.budget", "WARNING"):
+                self.assertEqual(self.client.get(reverse("home")).status_code, 200)
+
+
+class ServerTimingTests(BarnRaiseTestCase):
+    def test_page_reports_phases_in_header_and_log(self):
+        with self.assertLogs("activities.timing", "INFO") as logs:
+            response = self.client.get(self.city.get_absolute_url())
+
+        phases = {m.split(";")[0].strip() for m in response["Server-Timing"].split(",")}
+        self.assertTrue({"db", "tpl", "view", "total"} <= phases)
+        self.assertIn("url_name=city_detail htmx=False", logs.output[0])
+
+    def test_join_reports_session_time_and_htmx(self):
+        activity = self.create_activity()
+        with self.assertLogs("activities.timing", "INFO") as logs:
+            response = self.client.post(
+                reverse("activity_join", args=[activity.pk]), HTTP_HX_REQUEST="true"
+            )
+
+        self.assertIn("session;dur=", response["Server-Timing"])
+        self.assertIn("url_name=activity_join htmx=True", logs.output[0])
+
+
+class SharedCacheTests(BarnRaiseTestCase):
+    def test_commands_warn_when_purges_cannot_reach_other_workers(self):
+        stderr = StringIO()
+        call_command("sweep_activities", stdout=StringIO(), stderr=stderr)
+        self.assertIn("per-process", stderr.getvalue())
+
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with override_settings(CACHES=redis):
+            self.assertTrue(pagecache.shared())
+
+    def test_deploy_check_flags_local_cache(self):
+        self.assertEqual([w.id for w in checks.shared_cache_check(None)], ["activities.W001"])
+
+
+class GenerateDataTests(BarnRaiseTestCase):
+    def test_generates_consistent_dataset(self):
+        call_command(
+            "generate_data", cities=2, neighborhoods=6, activities=40, seed=1, stdout=StringIO()
+        )
+
+        generated = Activity.objects.filter(neighborhood__city__slug__startswith="synthetic-")
+        self.assertEqual(generated.count(), 40)
+        for activity in generated:
+            self.assertEqual(
+                activity.ends_at, activity.starts_at + timedelta(minutes=activity.duration_minutes)
+            )
+        self.assertEqual(
+            ActivityJoin.objects.filter(activity__in=generated).count(),
+            sum(generated.values_list("helpers_joined", flat=True)),
+        )
+        self.assertTrue(ActivityCount.objects.filter(city__slug__startswith="synthetic-").exists())
+
+
+class GeographyImportTests(BarnRaiseTestCase):
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / name
+        path.write_text(content)
+        return str(path)
+
+    def test_csv_import_dedupes_and_upserts(self):
+        path = self.write("places.csv", (
+            "city,state,neighborhood\n"
+            "Austin,Texas,Mueller\n"
+            "Austin,Texas,Hyde Park\n"
+            "Austin,Texas,Hyde  Park\n"
+            "Springfield,Illinois,Downtown\n"
+            "Springfield,Missouri,\n"
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(City.objects.get(slug="austin").pk, self.city.pk)
+        self.assertEqual(
+            Neighborhood.objects.filter(city=self.city).count(), 3  # Mueller, Zilker, Hyde Park
+        )
+        self.assertTrue(City.objects.filter(slug="springfield-missouri").exists())
+        self.assertTrue(Neighborhood.objects.filter(city__slug="springfield", slug="downtown").exists())
+
+    def test_import_purges_neighborhood_pages_and_home_list(self):
+        City.objects.filter(pk=self.city.pk).update(name="Old Austin")
+        self.client.get(reverse("home"))
+        self.client.get(self.neighborhood.get_absolute_url())
+        self.assertIsNotNone(cache.get(pagecache.page_key("austin", "mueller", "today")))
+        path = self.write("places.csv", "city,state,neighborhood\nAustin,Texas,\n")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertIsNone(cache.get(pagecache.page_key("austin", "mueller", "today")))
+        self.assertEqual(self.client.get(reverse("home")).context["cities"][0].name, "Austin")
+
+    def test_import_refreshes_only_renamed_listings(self):
+        mueller = self.create_activity()
+        zilker = self.create_activity(neighborhood=self.other)
+        ActivityListing.objects.filter(pk=zilker.pk).update(title="Untouched")
+        path = self.write(
+            "places.csv", "city,state,neighborhood,slug\nAustin,Texas,Mueller Park,mueller\nAustin,Texas,Zilker,zilker\n"
+        )
+
+        with mock.patch.object(listings, "rebuild", side_effect=AssertionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(ActivityListing.objects.get(pk=mueller.pk).neighborhood_name, "Mueller Park")
+        self.assertEqual(ActivityListing.objects.get(pk=zilker.pk).title, "Untouched")
+
+    def test_names_without_an_ascii_slug_are_rejected(self):
+        for row in ["東京,Tokyo,\n", "Austin,Texas,---\n"]:
+            with self.assertRaisesMessage(geography.GeographyError, "no URL slug"):
+                geography.read([self.write("places.csv", "city,state,neighborhood\n" + row)])
+
+        path = self.write("places.csv", "city,state,neighborhood,city_slug,slug\n東京,Tokyo,渋谷,tokyo,shibuya\n")
+        call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(Neighborhood.objects.filter(city__slug="tokyo", slug="shibuya").exists())
+
+    def test_city_slugs_never_shadow_other_routes(self):
+        prefixes = set()
+        for pattern in get_resolver().url_patterns:
+            for route in getattr(pattern, "url_patterns", [pattern]):
+                prefixes.add(f"{pattern.pattern}{route.pattern}".split("/")[0])
+        prefixes -= {"", "<slug:city_slug>"}
+        self.assertLessEqual(prefixes, RESERVED_CITY_SLUGS - {"static"})
+
+        path = self.write("places.csv", "city,state,neighborhood\nNear,Texas,Downtown\n")
+        call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(City.objects.filter(slug="near-texas").exists())
+
+        with self.assertRaisesMessage(geography.GeographyError, "another page's URL"):
+            geography.read([self.write("bad.csv", "city,state,city_slug\nApi,Texas,api\n")])
+        with self.assertRaises(ValidationError):
+            City(name="Api", state="Texas", slug="api").full_clean()
+
+    def test_import_never_moves_a_stored_city_to_another_state(self):
+        City.objects.create(name="Springfield", state="Missouri", slug="springfield")
+        path = self.write("places.csv", "city,state,neighborhood\nSpringfield,Illinois,Downtown\n")
+        call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(City.objects.get(slug="springfield").state, "Missouri")
+        self.assertTrue(Neighborhood.objects.filter(
+            city__slug="springfield-illinois", city__state="Illinois", slug="downtown"
+        ).exists())
+
+        path = self.write("more.csv", "city,state,neighborhood\nSpringfield,Illinois,Uptown\n")
+        call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(City.objects.filter(name="Springfield").count(), 2)
+
+        path = self.write("bad.csv", "city,state,city_slug\nSpringfield,Ohio,springfield\n")
+        with self.assertRaises(geography.GeographyError):
+            geography.read([path])
+
+    def test_geojson_import_updates_names_in_place(self):
+        path = self.write("places.geojson", json.dumps({
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": None,
+                "properties": {"city": "Austin", "state": "Texas", "name": "Mueller", "slug": "mueller"},
+            }],
+        }))
+        Neighborhood.objects.filter(pk=self.neighborhood.pk).update(name="Old name")
+
+        call_command("import_geography", path, stdout=StringIO(), stderr=StringIO())
+
+        self.neighborhood.refresh_from_db()
+        self.assertEqual(self.neighborhood.name, "Mueller")
+        self.assertEqual(Neighborhood.objects.count(), 2)
+
+    def test_import_sets_coordinates_without_clearing_them(self):
+        geojson = self.write("places.geojson", json.dumps({
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [-97.70, 30.30]},
+                "properties": {"city": "Austin", "state": "Texas", "name": "Mueller"},
+            }],
+        }))
+        call_command("import_geography", geojson, stdout=StringIO(), stderr=StringIO())
+        self.neighborhood.refresh_from_db()
+        self.assertEqual((self.neighborhood.latitude, self.neighborhood.longitude), (30.30, -97.70))
+
+        csv_path = self.write("places.csv", "city,state,neighborhood,latitude,longitude\nAustin,Texas,Mueller,,\n")
+        call_command("import_geography", csv_path, stdout=StringIO(), stderr=StringIO())
+        self.neighborhood.refresh_from_db()
+        self.assertEqual(self.neighborhood.latitude, 30.30)
+
+        bad = self.write("bad.csv", "city,state,neighborhood,latitude,longitude\nAustin,Texas,Mueller,95,0\n")
+        with self.assertRaises(geography.GeographyError):
+            geography.read([bad])
+
+
+@override_settings(ARCHIVE_AFTER_DAYS=30)
+class ArchiveTests(BarnRaiseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = self.create_activity(starts_at=timezone.now() - timedelta(days=40))
+        self.recent = self.create_activity(starts_at=timezone.now() - timedelta(days=10))
+
+    def test_moves_old_activities_and_joins_in_batches(self):
+        ActivityJoin.objects.create(activity=self.old, session_key="a" * 32)
+        older = self.create_activity(starts_at=timezone.now() - timedelta(days=50))
+
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=1), 1)
+        self.assertTrue(ArchivedActivity.objects.filter(pk=older.pk).exists())
+        call_command("archive_activities", stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(list(Activity.objects.values_list("pk", flat=True)), [self.recent.pk])
+        archived = ArchivedActivity.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.secret_token, self.old.secret_token)
+        self.assertEqual(list(archived.joins.values_list("session_key", flat=True)), ["a" * 32])
+        self.assertFalse(ActivityJoin.objects.exists())
+
+    def test_links_keep_working_after_archival(self):
+        self.client.post(reverse("activity_join", args=[self.recent.pk]))
+        archive.archive_batch(archive.cutoff())
+
+        response = self.client.get(self.old.get_absolute_url())
+        self.assertContains(response, "No longer looking for helpers")
+        response = self.client.get(self.old.get_manage_url())
+        self.assertContains(response, "has been archived")
+
+        response = self.client.post(self.old.get_manage_url(), {"action": "cancel"})
+        self.assertRedirects(response, self.old.get_manage_url())
+        self.assertEqual(ArchivedActivity.objects.get(pk=self.old.pk).status, "active")
+
+        response = self.client.post(reverse("activity_join", args=[self.old.pk]))
+        self.assertRedirects(response, self.old.get_absolute_url())
+        self.assertFalse(ArchivedActivity.objects.get(pk=self.old.pk).joins.exists())
+
+    def test_edit_racing_archival_does_not_recreate_the_activity(self):
+        stale = Activity.objects.get(pk=self.old.pk)
+        archive.archive_batch(archive.cutoff())
+
+        with mock.patch("activities.views.archive.get_activity_or_404", return_value=stale):
+            self.client.post(self.old.get_manage_url(), {"action": "cancel"})
+            self.client.post(self.old.get_manage_url(), {
+                "action": "update",
+                "title": "Renamed",
+                "description": stale.description,
+                "neighborhood": stale.neighborhood_id,
+                "location_hint": stale.location_hint,
+                "starts_at": stale.starts_at.strftime("%Y-%m-%dT%H:%M"),
+                "duration_minutes": stale.duration_minutes,
+                "helpers_needed": stale.helpers_needed,
+                "host_email": stale.host_email,
+            })
+
+        self.assertFalse(Activity.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(ArchivedActivity.objects.get(pk=self.old.pk).title, self.old.title)
+
+
+class SweeperTests(BarnRaiseTestCase):
+    def test_completes_only_ended_active_activities(self):
+        ended = [
+            self.create_activity(starts_at=timezone.now() - timedelta(hours=h)) for h in (3, 4, 5)
+        ]
+        cancelled = self.create_activity(
+            starts_at=timezone.now() - timedelta(hours=3), status=Activity.Status.CANCELLED
+        )
+        running = self.create_activity(starts_at=timezone.now() - timedelta(minutes=30))
+
+        self.assertEqual(sweeper.sweep(batch_size=2), 3)
+        call_command("sweep_activities", stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(
+            set(Activity.objects.filter(status=Activity.Status.COMPLETED).values_list("pk", flat=True)),
+            {a.pk for a in ended},
+        )
+        cancelled.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(cancelled.status, Activity.Status.CANCELLED)
+        self.assertEqual(running.status, Activity.Status.ACTIVE)
+
+
+class NeighborhoodPaginationTests(BarnRaiseTestCase):
+    def test_pages_follow_starts_at_then_id(self):
+        start = timezone.now() + timedelta(hours=1)
+        activities = [
+            self.create_activity(starts_at=start + timedelta(minutes=i // 2))
+            for i in range(pagination.PAGE_SIZE + 5)
+        ]
+
+        response = self.client.get(self.neighborhood.get_absolute_url(), {"filter": "week"})
+        first = [listing.pk for listing in response.context["activities"]]
+        self.assertEqual(first, [a.pk for a in activities[:pagination.PAGE_SIZE]])
+        self.assertContains(response, 'hx-trigger="revealed"')
+
+        response = self.client.get(
+            reverse("neighborhood_activities", args=["austin", "mueller"]),
+            {"filter": "week", "after": response.context["next_cursor"]},
+            HTTP_HX_REQUEST="true",
+        )
+        self.assertEqual(
+            [listing.pk for listing in response.context["activities"]],
+            [a.pk for a in activities[pagination.PAGE_SIZE:]],
+        )
+        self.assertIsNone(response.context["next_cursor"])
+        self.assertNotContains(response, 'hx-trigger="revealed"')
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(
+            reverse("neighborhood_activities", args=["austin", "mueller"]), {"after": "x-1"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CardCacheTests(BarnRaiseTestCase):
+    def test_card_template_is_only_rendered_through_the_cache(self):
+        templates = Path(settings.BASE_DIR) / "templates"
+        self.assertEqual(
+            [path.name for path in templates.rglob("*.html") if cards.TEMPLATE in path.read_text()],
+            [],
+        )
+
+    def test_cards_render_once_per_version_and_minute(self):
+        activities = [self.create_activity(), self.create_activity(title="Mural painting")]
+
+        with mock.patch("activities.cards.render_to_string", return_value="<a></a>") as render:
+            cards.render(activities)
+            self.assertEqual(cards.render(activities), ["<a></a>", "<a></a>"])
+            self.assertEqual(render.call_count, 2)
+
+            activities[0].save()
+            cards.render(activities)
+            self.assertEqual(render.call_count, 3)
+
+            with mock.patch("activities.cards.bucket", return_value=cards.bucket() + 1):
+                cards.render(activities)
+            self.assertEqual(render.call_count, 5)
+
+    def test_neighborhood_page_shows_updated_card(self):
+        activity = self.create_activity(title="Garden cleanup")
+        self.client.get(self.neighborhood.get_absolute_url())
+
+        activity.title = "Tool library"
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.save()
+        response = self.client.get(self.neighborhood.get_absolute_url())
+        self.assertContains(response, "Tool library")
+        self.assertNotContains(response, "Garden cleanup")
+
+
+class AsyncViewTests(BarnRaiseTestCase):
+    async def test_async_views_run_through_async_middleware(self):
+        activity = await sync_to_async(self.create_activity)(helpers_needed=2)
+
+        response = await self.async_client.get(activity.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"2 queries"', response["Server-Timing"])
+        response = await self.async_client.get(
+            activity.get_absolute_url(), headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(self.neighborhood.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([listing.pk for listing in response.context["activities"]], [activity.pk])
+
+        response = await self.async_client.get(reverse("search_locations"), {"q": "muel"})
+        self.assertContains(response, "Mueller")
+
+        response = await self.async_client.post(
+            reverse("activity_join", args=[activity.pk]), headers={"hx-request": "true"}
+        )
+        self.assertContains(response, "You're going!")
+        await activity.arefresh_from_db()
+        self.assertEqual(activity.helpers_joined, 1)
+
+
+class LiveEventsTests(BarnRaiseTestCase):
+    def test_join_publishes_after_commit(self):
+        activity = self.create_activity(helpers_needed=1)
+        with mock.patch.object(live, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                joining.join_activity(activity.pk, "a" * 32)
+
+        publish.assert_called_once_with({
+            "id": activity.pk,
+            "neighborhood": self.neighborhood.pk,
+            "helpers_joined": 1,
+            "helpers_needed": 1,
+            "status": "active",
+        })
+        self.assertEqual(
+            live.format_event(publish.call_args[0][0]),
+            f"event: helpers-{activity.pk}\ndata: 1\n\n"
+            f"event: state-{activity.pk}\ndata: active\n\n",
+        )
+
+    async def test_stream_sends_snapshot_then_published_updates(self):
+        activity = await sync_to_async(self.create_activity)(helpers_needed=3)
+        response = await self.async_client.get(reverse("activity_events", args=[activity.pk]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        self.assertEqual(await anext(chunks), f"event: helpers-{activity.pk}\ndata: 0\n\n".encode())
+        self.assertEqual(live.hub.listener_count(), 1)
+
+        # Published without a query: this thread's queries count toward the stream's budget.
+        live.publish({**live.event_for(activity), "helpers_joined": 2})
+        self.assertEqual(await anext(chunks), f"event: helpers-{activity.pk}\ndata: 2\n\n".encode())
+
+
+class StreamingBudgetTests(BarnRaiseTestCase):
+    async def test_queries_inside_a_stream_count_toward_its_budget(self):
+        await sync_to_async(self.create_activity)()
+        with override_settings(QUERY_BUDGETS={"api_activities": 0}):
+            response = await self.async_client.get(reverse("api_activities"))
+            with self.assertRaisesMessage(QueryBudgetExceeded, "api_activities ran 1"):
+                [chunk async for chunk in response.streaming_content]
+
+    async def test_stream_closed_from_another_thread_drops_its_wrapper(self):
+        async def content():
+            yield b"chunk"
+
+        stats = QueryStats()
+        chunks = QueryBudgetMiddleware(None)._acounted(RequestFactory().get("/"), content(), stats)
+        await anext(chunks)
+        # An abandoned stream is finalized outside the request's context.
+        closer = threading.Thread(target=asyncio.run, args=[chunks.aclose()])
+        closer.start()
+        closer.join()
+        self.assertNotIn(stats, await sync_to_async(lambda: connection.execute_wrappers)())
+
+
+class WsgiLiveUpdatesTests(BarnRaiseTestCase):
+    def test_no_streams_under_wsgi(self):
+        activity = self.create_activity()
+        self.assertNotContains(self.client.get(activity.get_absolute_url()), "sse-connect")
+        self.assertNotContains(self.client.get(self.neighborhood.get_absolute_url()), "sse-connect")
+        for url in [
+            reverse("activity_events", args=[activity.pk]),
+            reverse("neighborhood_events", args=[self.city.slug, self.neighborhood.slug]),
+        ]:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 204)
+
+    async def test_streams_offered_under_asgi(self):
+        activity = await sync_to_async(self.create_activity)()
+        response = await self.async_client.get(activity.get_absolute_url())
+        self.assertContains(response, "sse-connect")
+
+
+class LiveStreamConnectionTests(TransactionTestCase):
+    async def test_stream_holds_no_connection_after_snapshot(self):
+        city = await City.objects.acreate(name="Austin", state="Texas", slug="austin")
+        neighborhood = await Neighborhood.objects.acreate(city=city, name="Mueller", slug="mueller")
+        activity = await sync_to_async(make_activity)(neighborhood)
+        response = await self.async_client.get(reverse("activity_events", args=[activity.pk]))
+        chunks = aiter(response.streaming_content)
+
+        await anext(chunks)
+        await anext(chunks)
+        with mock.patch.object(live, "KEEPALIVE", 0.01):
+            self.assertEqual(await anext(chunks), b": keepalive\n\n")
+        self.assertIsNone(await sync_to_async(lambda: connection.connection)())
+
+
+class ActivityFeedTests(BarnRaiseTestCase):
+    async def read_feed(self, url, data=None):
+        response = await self.async_client.get(url, data)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return json.loads(b"".join([chunk async for chunk in response.streaming_content]))
+
+    @mock.patch.object(feeds, "CHUNK_SIZE", 2)
+    @mock.patch.object(feeds, "SINCE_MARGIN", timedelta(0))
+    async def test_feed_streams_active_rows_then_changes_since(self):
+        await sync_to_async(self.create_activity)(status=Activity.Status.CANCELLED)
+        await sync_to_async(self.create_activity)(starts_at=timezone.now() - timedelta(hours=5))
+        first, second, third = [
+            await sync_to_async(self.create_activity)(title=f"Activity {i}") for i in range(3)
+        ]
+
+        feed = await self.read_feed(reverse("api_activities"))
+        self.assertEqual([row["id"] for row in feed["activities"]], [first.pk, second.pk, third.pk])
+        row = feed["activities"][0]
+        self.assertEqual((row["city_slug"], row["neighborhood_slug"]), ("austin", "mueller"))
+        self.assertNotIn("host_email", row)
+        self.assertEqual(feed["next_since"], third.updated_at.isoformat())
+
+        second.status = Activity.Status.CANCELLED
+        await sync_to_async(second.save)()
+        feed = await self.read_feed(reverse("api_activities"), {"since": feed["next_since"]})
+        self.assertEqual(feed["activities"][0]["status"], "cancelled")
+        self.assertEqual([row["id"] for row in feed["activities"]], [second.pk])
+
+        feed = await self.read_feed(reverse("api_activities"), {"since": feed["next_since"]})
+        self.assertEqual(feed["activities"], [])
+
+    async def test_rows_committed_after_a_later_row_are_not_skipped(self):
+        first = await sync_to_async(self.create_activity)()
+        feed = await self.read_feed(reverse("api_activities"))
+        self.assertLess(feeds.parse_since(feed["next_since"]), first.updated_at)
+
+        # Stamped before `first` but committed only after the read above.
+        late = await sync_to_async(self.create_activity)()
+        await Activity.objects.filter(pk=late.pk).aupdate(
+            updated_at=first.updated_at - timedelta(microseconds=1)
+        )
+        feed = await self.read_feed(reverse("api_activities"), {"since": feed["next_since"]})
+        self.assertEqual([row["id"] for row in feed["activities"]], [late.pk, first.pk])
+
+    async def test_neighborhood_feed_uses_time_window(self):
+        today = await sync_to_async(self.create_activity)()
+        await sync_to_async(self.create_activity)(starts_at=timezone.now() + timedelta(days=3))
+        await sync_to_async(self.create_activity)(neighborhood=self.other)
+        url = reverse("api_neighborhood_activities", args=["austin", "mueller"])
+
+        feed = await self.read_feed(url)
+        self.assertEqual([row["id"] for row in feed["activities"]], [today.pk])
+        feed = await self.read_feed(url, {"filter": "week"})
+        self.assertEqual(len(feed["activities"]), 2)
+        feed = await self.read_feed(reverse("api_city_activities", args=["austin"]))
+        self.assertEqual(len(feed["activities"]), 2)
+
+        response = await self.async_client.get(url, {"since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+
+class NearbyTests(BarnRaiseTestCase):
+    def setUp(self):
+        super().setUp()
+        Neighborhood.objects.filter(pk=self.neighborhood.pk).update(latitude=30.30, longitude=-97.70)
+        Neighborhood.objects.filter(pk=self.other.pk).update(latitude=30.26, longitude=-97.77)
+
+    def test_nearest_uses_pins_then_neighborhood_centers(self):
+        pinned = self.create_activity(title="Pinned", latitude=30.301, longitude=-97.701)
+        unpinned = self.create_activity(title="Unpinned")
+        farther = self.create_activity(neighborhood=self.other, title="Farther")
+        self.create_activity(title="Far pin", latitude=30.50, longitude=-97.70)
+        self.create_activity(title="Cancelled", status=Activity.Status.CANCELLED)
+        self.create_activity(title="Ended", starts_at=timezone.now() - timedelta(hours=5))
+
+        with self.assertNumQueries(1):
+            found = nearby.nearest(30.30, -97.70, radius_km=10)
+        self.assertEqual([listing.pk for listing in found], [unpinned.pk, pinned.pk, farther.pk])
+        self.assertAlmostEqual(found[2].distance_km, 8.06, places=2)
+        found = nearby.nearest(30.30, -97.70, radius_km=1)
+        self.assertEqual([listing.pk for listing in found], [unpinned.pk, pinned.pk])
+
+    def test_nearest_wraps_across_the_antimeridian(self):
+        east = self.create_activity(title="East", latitude=-17.0, longitude=179.99)
+        west = self.create_activity(title="West", latitude=-17.0, longitude=-179.99)
+
+        found = nearby.nearest(-17.0, 179.98, radius_km=10)
+        self.assertEqual([listing.pk for listing in found], [east.pk, west.pk])
+        found = nearby.nearest(-17.0, -179.98, radius_km=10)
+        self.assertEqual([listing.pk for listing in found], [west.pk, east.pk])
+
+    def test_near_me_page(self):
+        self.create_activity(title="Garden cleanup")
+
+        response = self.client.get(reverse("near_me"))
+        self.assertContains(response, "Use my location")
+
+        response = self.client.get(reverse("near_me"), {"lat": "30.3", "lng": "-97.7"})
+        self.assertContains(response, "Garden cleanup")
+        self.assertContains(response, "0.0 km away")
+
+        response = self.client.get(reverse("near_me"), {"lat": "nan", "lng": "-97.7"})
+        self.assertContains(response, "Use my location")
+
+    def test_directions_use_coordinates(self):
+        activity = self.create_activity(latitude=30.301, longitude=-97.701)
+        response = self.client.get(reverse("activity_directions", args=[activity.pk]))
+        self.assertTrue(response["Location"].endswith("query=30.301,-97.701"))
+
+
+class ActivityListingTests(BarnRaiseTestCase):
+    def test_listing_follows_activity_and_location_changes(self):
+        activity = self.create_activity(title="Garden cleanup", helpers_needed=3)
+        listing = ActivityListing.objects.get(pk=activity.pk)
+        self.assertEqual(
+            (listing.city_slug, listing.neighborhood_name, listing.url, listing.helpers_remaining),
+            ("austin", "Mueller", activity.get_absolute_url(), 3),
+        )
+        self.assertEqual(listing.location, "Near the park, Mueller, Austin, Texas")
+
+        joining.join_activity(activity.pk, "a" * 32)
+        listing.refresh_from_db()
+        self.assertEqual((listing.helpers_joined, listing.helpers_remaining), (1, 2))
+
+        self.neighborhood.name = "Mueller East"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neighborhood.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.neighborhood_name, "Mueller East")
+
+        activity.status = Activity.Status.CANCELLED
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.save(update_fields=["status"])
+        self.assertFalse(ActivityListing.objects.filter(pk=activity.pk).exists())
+
+    def test_sweep_removes_listing_and_rebuild_restores_live_rows(self):
+        ended = self.create_activity()
+        live_activity = self.create_activity()
+        past = timezone.now() - timedelta(hours=1)
+        Activity.objects.filter(pk=ended.pk).update(starts_at=past - timedelta(hours=2), ends_at=past)
+
+        sweeper.sweep()
+        self.assertEqual(list(ActivityListing.objects.values_list("pk", flat=True)), [live_activity.pk])
+
+        ActivityListing.objects.all().delete()
+        listings.rebuild()
+        self.assertEqual(list(ActivityListing.objects.values_list("pk", flat=True)), [live_activity.pk])
+
+    def test_neighborhood_page_reads_listings_only(self):
+        self.create_activity()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.neighborhood.get_absolute_url())
+        tables = {"activities_activity", "activities_city"}
+        for query in queries.captured_queries:
+            if "activitylisting" in query["sql"]:
+                self.assertFalse(any(f'"{table}"' in query["sql"] for table in tables))
+
+
+@override_settings(RATE_LIMITS={
+    "search_locations": "3/m",
+    "activity_post": {"rate": "1/h", "methods": ["POST"]},
+})
+class RateLimitTests(BarnRaiseTestCase):
+    def test_token_bucket_refills_over_time(self):
+        self.assertEqual(ratelimit.take("bucket", 2, 60, now=0), 0)
+        self.assertEqual(ratelimit.take("bucket", 2, 60, now=0), 0)
+        self.assertEqual(ratelimit.take("bucket", 2, 60, now=0), 30)
+        self.assertEqual(ratelimit.take("bucket", 2, 60, now=30), 0)
+
+    def test_processes_sharing_a_cache_share_one_bucket(self):
+        # Two clients of one cache store, as two workers are of one Redis.
+        workers = [LocMemCache("ratelimit-shared", {}) for _ in range(2)]
+        with mock.patch.object(ratelimit, "cache", workers[0]):
+            self.assertEqual(ratelimit.take("bucket", 1, 60, now=0), 0)
+        with mock.patch.object(ratelimit, "cache", workers[1]):
+            self.assertEqual(ratelimit.take("bucket", 1, 60, now=0), 60)
+        workers[0].clear()
+
+    def test_search_is_limited_per_ip_before_any_query(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("search_locations"), {"q": "x"}).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse("search_locations"), {"q": "muel"}, HTTP_HX_REQUEST="true"
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        self.assertContains(response, "try again in 20 seconds", status_code=429)
+        self.assertNotContains(response, "<html", status_code=429)
+
+        other = self.client.get(reverse("search_locations"), {"q": "x"}, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(other.status_code, 200)
+
+    def test_session_bucket_applies_across_ips(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "s" * 32
+        for i in range(3):
+            self.client.get(reverse("search_locations"), {"q": "x"}, REMOTE_ADDR=f"10.0.1.{i}")
+        response = self.client.get(reverse("search_locations"), {"q": "x"}, REMOTE_ADDR="10.0.1.9")
+        self.assertEqual(response.status_code, 429)
+
+    def test_method_specific_limit(self):
+        self.client.post(reverse("activity_post"), {})
+        self.assertEqual(self.client.get(reverse("activity_post")).status_code, 200)
+        response = self.client.post(reverse("activity_post"), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, "Too many requests", status_code=429)
+
+
+class TieredCacheTests(BarnRaiseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.family = tiered.FAMILIES.get("test") or tiered.Family("test", ttl=30, stale=60)
+        tiered.reset_stats()
+
+    def test_lru_drops_least_recently_used(self):
+        lru = tiered.LRU(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+
+    def test_fetch_fills_both_tiers_and_counts_hits(self):
+        compute = mock.Mock(return_value="value")
+        self.assertEqual(self.family.fetch("k", compute), "value")
+        self.assertEqual(self.family.fetch("k", compute), "value")
+        tiered.clear_local()
+        self.assertEqual(self.family.fetch("k", compute), "value")
+
+        self.assertEqual(compute.call_count, 1)
+        row = tiered.stats()["test"]
+        self.assertEqual((row["l1"], row["l2"], row["miss"]), (1, 1, 1))
+        self.assertAlmostEqual(row["hit_ratio"], 2 / 3)
+
+    def test_stale_value_served_while_another_worker_recomputes(self):
+        key = self.family.key("k")
+        cache.set(key, ("old", 0), 60)
+        compute = mock.Mock(return_value="new")
+
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(self.family.fetch("k", compute), "old")
+        compute.assert_not_called()
+
+        cache.delete(f"{key}:lock")
+        self.assertEqual(self.family.fetch("k", compute), "new")
+        self.assertEqual(tiered.stats()["test"]["stale"], 1)
+
+    def test_home_served_from_cache_until_counts_change(self):
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["cities"][0].activity_count, 0)
+
+        self.create_activity()
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["cities"][0].activity_count, 1)
+
+
+class DBPoolTests(BarnRaiseTestCase):
+    def fake_pool(self):
+        pool = mock.Mock()
+        pool.pop_stats.return_value = {
+            "pool_min": 1, "pool_max": 4, "pool_size": 3, "pool_available": 1,
+            "requests_waiting": 2, "requests_num": 40, "requests_queued": 4,
+            "requests_wait_ms": 90, "requests_errors": 1,
+        }
+        return mock.patch.object(connections["default"], "pool", pool, create=True)
+
+    def test_no_pool_without_psycopg_pool(self):
+        self.assertIsNone(dbpool.stats())
+
+    def test_stats_report_saturation(self):
+        with self.fake_pool():
+            stats = dbpool.stats(reset=True)
+        self.assertEqual(
+            (stats["in_use"], stats["overflow"], stats["waiting"], stats["queued"]), (2, 2, 2, 4)
+        )
+        self.assertEqual((stats["avg_wait_ms"], stats["timeouts"]), (22.5, 1))
+
+    @override_settings(DB_POOL_STATS_INTERVAL=0)
+    def test_requests_log_pool_stats(self):
+        with self.fake_pool(), self.assertLogs("activities.dbpool", "INFO") as logs:
+            self.client.get(reverse("activity_post"))
+        self.assertIn("in_use=2 overflow=2", logs.output[0])
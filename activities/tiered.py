@@ -0,0 +1,197 @@
+"""
+Two-tier cache for values that are costly to compute and read on most requests.
+
+L1 is a small LRU in each worker process; L2 is Django's default cache,
+shared between workers when the cache is. A ``Family`` names one kind of
+value (``home`` for the home page's city list) and sets how long its values
+are fresh (``ttl``) and how much longer a stale copy may be served while it
+is recomputed (``stale``).
+
+``fetch`` tries L1, then L2. A stale L2 value is returned as is unless this
+caller wins the key's recompute lock (``cache.add``), in which case it
+recomputes inline, so only one worker rebuilds a value when it expires. On a
+cold miss, callers that lose the lock wait up to ``WAIT_SECONDS`` for the
+winner's value before computing it themselves.
+
+``invalidate`` deletes the L2 entry and this worker's L1 copy. Other workers
+keep their L1 copy for at most ``TIERED_CACHE_L1_TTL`` seconds, which bounds
+how far they lag behind a write. A value computed while a write commits can
+outlive its invalidation by up to ``ttl``.
+
+L1 hits, L2 hits, stale serves and misses are counted per family in process
+and added to the cache every ``STATS_FLUSH_SECONDS``; ``manage.py
+tiered_cache_stats`` reports them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+FAMILIES = {}
+KINDS = ["l1", "l2", "stale", "miss"]
+LOCK_SECONDS = 30
+WAIT_SECONDS = 2
+POLL_SECONDS = 0.05
+STATS_FLUSH_SECONDS = 10
+
+
+class LRU:
+    """A bounded, thread-safe mapping that drops its least recently used key."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+local = LRU(settings.TIERED_CACHE_L1_MAX_ENTRIES)
+
+_counts = {}
+_counts_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def stats_key(family, kind):
+    return f"tiered:stats:{family}:{kind}"
+
+
+def _count(family, kind):
+    global _flushed_at
+    with _counts_lock:
+        _counts[family, kind] = _counts.get((family, kind), 0) + 1
+        if time.monotonic() - _flushed_at < STATS_FLUSH_SECONDS:
+            return
+    flush_stats()
+
+
+def flush_stats():
+    """Add this process's pending counters to the shared ones."""
+    global _flushed_at
+    with _counts_lock:
+        pending = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    for (family, kind), count in pending.items():
+        key = stats_key(family, kind)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, count, None)
+
+
+def stats():
+    """Map each family name to its counters and hit ratio."""
+    flush_stats()
+    keys = [stats_key(name, kind) for name in FAMILIES for kind in KINDS]
+    counters = cache.get_many(keys)
+    report = {}
+    for name in FAMILIES:
+        row = {kind: counters.get(stats_key(name, kind), 0) for kind in KINDS}
+        total = sum(row.values())
+        row["hit_ratio"] = (total - row["miss"]) / total if total else 0.0
+        report[name] = row
+    return report
+
+
+def reset_stats():
+    with _counts_lock:
+        _counts.clear()
+    cache.delete_many([stats_key(name, kind) for name in FAMILIES for kind in KINDS])
+
+
+def clear_local():
+    """Drop this process's L1 entries (tests; other workers are unaffected)."""
+    local.clear()
+
+
+class Family:
+    def __init__(self, name, ttl, stale=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale = stale
+        FAMILIES[name] = self
+
+    def key(self, key):
+        return f"tiered:{self.name}:{key}"
+
+    def fetch(self, key, compute):
+        """Return the value cached under key, calling compute() to (re)build it."""
+        key = self.key(key)
+        now = time.time()
+        entry = local.get(key)
+        if entry is not None and now < entry[1]:
+            _count(self.name, "l1")
+            return entry[0]
+
+        cached = cache.get(key)
+        if cached is not None:
+            value, fresh_until = cached
+            if now < fresh_until:
+                _count(self.name, "l2")
+                self._keep(key, value, fresh_until)
+                return value
+            if not cache.add(f"{key}:lock", 1, LOCK_SECONDS):
+                _count(self.name, "stale")
+                return value
+            return self._compute(key, compute, locked=True)
+
+        if cache.add(f"{key}:lock", 1, LOCK_SECONDS):
+            return self._compute(key, compute, locked=True)
+        deadline = now + WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(POLL_SECONDS)
+            cached = cache.get(key)
+            if cached is not None:
+                _count(self.name, "l2")
+                self._keep(key, *cached)
+                return cached[0]
+        return self._compute(key, compute, locked=False)
+
+    def invalidate(self, *keys):
+        keys = [self.key(key) for key in keys]
+        for key in keys:
+            local.delete(key)
+        cache.delete_many(keys)
+
+    def _keep(self, key, value, fresh_until):
+        local.set(key, (value, min(fresh_until, time.time() + settings.TIERED_CACHE_L1_TTL)))
+
+    def _compute(self, key, compute, locked):
+        _count(self.name, "miss")
+        try:
+            value = compute()
+            fresh_until = time.time() + self.ttl
+            cache.set(key, (value, fresh_until), self.ttl + self.stale)
+            self._keep(key, value, fresh_until)
+        finally:
+            if locked:
+                cache.delete(f"{key}:lock")
+        return value
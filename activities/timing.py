@@ -0,0 +1,148 @@
+"""
+Per-request performance breakdown.
+
+``ServerTimingMiddleware`` times each request and reports the phases as a
+``Server-Timing`` header (visible in browser devtools) and as one structured
+log line on the ``activities.timing`` logger. The phases are:
+
+* ``db``: query time and count, read from the ``QueryStats`` that
+  ``QueryBudgetMiddleware`` attaches to the request
+* ``tpl``: template rendering, reported by ``TimedDjangoTemplates``
+* ``session``: session load and save, reported by ``activities.sessions``
+* ``connect``: getting a database connection (pool checkout on PostgreSQL),
+  reported by the ``activities.postgresql`` backend
+* ``view``: from URL resolution to the response, excluding session saving
+* ``total``: the whole request
+
+The middleware must sit outside ``SessionMiddleware`` to see the session
+save, and inside ``QueryBudgetMiddleware`` to read its query stats.
+"""
+
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    """Charge the enclosed block to phase on the current request, if any."""
+    timing = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing.add(phase, time.perf_counter() - start)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed("tpl"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The stock Django template backend, with rendering time reported."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = request.timing = RequestTiming()
+        token = _current.set(timing)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timing, start)
+        return response
+
+    async def __acall__(self, request):
+        timing = request.timing = RequestTiming()
+        token = _current.set(timing)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timing, start)
+        return response
+
+    def finish(self, request, response, timing, start):
+        end = time.perf_counter()
+        if hasattr(request, "_view_started"):
+            timing.add(
+                "view",
+                end - request._view_started - timing.phases.get("session_save", 0.0),
+            )
+        self.report(request, response, timing, end - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def report(self, request, response, timing, total):
+        phases = dict(timing.phases)
+        session = phases.pop("session_load", 0.0) + phases.pop("session_save", 0.0)
+        if session:
+            phases["session"] = session
+        stats = getattr(request, "query_stats", None)
+        if stats is not None:
+            phases["db"] = stats.duration
+        phases["total"] = total
+
+        metrics = []
+        for phase, seconds in phases.items():
+            metric = f"{phase};dur={seconds * 1000:.1f}"
+            if phase == "db":
+                metric += f';desc="{stats.count} queries"'
+            metrics.append(metric)
+        if settings.SERVER_TIMING_HEADER:
+            response.headers["Server-Timing"] = ", ".join(metrics)
+
+        match = getattr(request, "resolver_match", None)
+        fields = {
+            "url_name": match.url_name if match else None,
+            "htmx": bool(getattr(request, "htmx", False)),
+            "method": request.method,
+            "status": response.status_code,
+            "queries": stats.count if stats is not None else None,
+            **{f"{phase}_ms": round(seconds * 1000, 1) for phase, seconds in phases.items()},
+        }
+        logger.info(
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"timing": fields},
+        )
@@ -5,10 +5,21 @@ urlpatterns = [
     path("", views.home, name="home"),
     path("search/", views.search_locations, name="search_locations"),
     path("post/", views.activity_post, name="activity_post"),
+    path("near/", views.near_me, name="near_me"),
     path("activity/<int:pk>/", views.activity_detail, name="activity_detail"),
     path("activity/<int:pk>/join/", views.activity_join, name="activity_join"),
     path("activity/<int:pk>/directions/", views.activity_directions, name="activity_directions"),
+    path("activity/<int:pk>/events/", views.activity_events, name="activity_events"),
+    path("api/activities/", views.api_activities, name="api_activities"),
+    path("api/<slug:city_slug>/activities/", views.api_city_activities, name="api_city_activities"),
+    path(
+        "api/<slug:city_slug>/<slug:neighborhood_slug>/activities/",
+        views.api_neighborhood_activities,
+        name="api_neighborhood_activities",
+    ),
     path("manage/<str:token>/", views.activity_manage, name="activity_manage"),
     path("<slug:city_slug>/", views.city_detail, name="city_detail"),
     path("<slug:city_slug>/<slug:neighborhood_slug>/", views.neighborhood_detail, name="neighborhood_detail"),
+    path("<slug:city_slug>/<slug:neighborhood_slug>/more/", views.neighborhood_activities, name="neighborhood_activities"),
+    path("<slug:city_slug>/<slug:neighborhood_slug>/events/", views.neighborhood_events, name="neighborhood_events"),
 ]
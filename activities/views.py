@@ -1,152 +1,214 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, aget_object_or_404, get_object_or_404, redirect
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.utils import timezone
-from django.db.models import Count, Q
-from django.views.decorators.http import require_POST
-from datetime import timedelta
+from django.views.decorators.http import condition, require_POST
 
-from .models import City, Neighborhood, Activity, ActivityJoin
+from . import archive, cards, conditional, feeds, joining, ledger, live, nearby, pagecache, pagination, rollups, search
+from .models import City, Neighborhood, Activity, ActivityListing
+from .budget import query_budget
 from .forms import ActivityForm
 
 
+@query_budget(4)
 def home(request):
-    cities = City.objects.annotate(
-        activity_count=Count(
-            "neighborhoods__activities",
-            filter=Q(
-                neighborhoods__activities__status=Activity.Status.ACTIVE,
-                neighborhoods__activities__starts_at__gte=timezone.now() - timedelta(hours=2)
-            )
-        )
-    )
+    cities = rollups.city_list(Activity.Window.UPCOMING)
     return render(request, "home.html", {"cities": cities})
 
 
+@query_budget(8)
+@pagecache.cached_page
+@condition(etag_func=conditional.city_etag)
 def city_detail(request, city_slug):
     city = get_object_or_404(City, slug=city_slug)
     time_filter = request.GET.get("filter", "today")
+    window = Activity.Window.from_filter(time_filter)
 
-    now = timezone.now()
-    base_query = Q(
-        activities__status=Activity.Status.ACTIVE,
-    )
-
-    if time_filter == "now":
-        base_query &= Q(
-            activities__starts_at__lte=now,
-            activities__starts_at__gte=now - timedelta(hours=4)
-        )
-    elif time_filter == "week":
-        base_query &= Q(
-            activities__starts_at__gte=now - timedelta(hours=2),
-            activities__starts_at__lte=now + timedelta(days=7)
-        )
-    else:
-        end_of_day = now.replace(hour=23, minute=59, second=59)
-        base_query &= Q(
-            activities__starts_at__gte=now - timedelta(hours=2),
-            activities__starts_at__lte=end_of_day
-        )
-
-    neighborhoods = city.neighborhoods.annotate(
-        activity_count=Count("activities", filter=base_query)
-    ).filter(activity_count__gt=0)
+    neighborhoods = rollups.neighborhood_counts(city, window)
 
-    return render(request, "activities/city.html", {
+    response = render(request, "activities/city.html", {
         "city": city,
         "neighborhoods": neighborhoods,
         "time_filter": time_filter,
     })
+    response.valid_until = rollups.next_change(window, city.pk)
+    return response
 
 
-def neighborhood_detail(request, city_slug, neighborhood_slug):
-    neighborhood = get_object_or_404(
-        Neighborhood,
+@query_budget(6)
+@pagecache.cached_page
+@conditional.acondition(etag_func=conditional.neighborhood_etag)
+async def neighborhood_detail(request, city_slug, neighborhood_slug):
+    neighborhood = await aget_object_or_404(
+        Neighborhood.objects.select_related("city"),
         slug=neighborhood_slug,
         city__slug=city_slug
     )
     time_filter = request.GET.get("filter", "today")
 
+    window = Activity.Window.from_filter(time_filter)
     now = timezone.now()
-    activities = neighborhood.activities.filter(status=Activity.Status.ACTIVE)
-
-    if time_filter == "now":
-        activities = activities.filter(
-            starts_at__lte=now,
-            starts_at__gte=now - timedelta(hours=4)
-        )
-    elif time_filter == "week":
-        activities = activities.filter(
-            starts_at__gte=now - timedelta(hours=2),
-            starts_at__lte=now + timedelta(days=7)
-        )
-    else:
-        end_of_day = now.replace(hour=23, minute=59, second=59)
-        activities = activities.filter(
-            starts_at__gte=now - timedelta(hours=2),
-            starts_at__lte=end_of_day
-        )
 
-    return render(request, "activities/neighborhood.html", {
+    activities, next_cursor = await pagination.apage(
+        neighborhood.listings.in_window(window, now)
+    )
+    next_change = await sync_to_async(rollups.next_change)(
+        window, neighborhood.city_id, neighborhood.pk
+    )
+
+    response = render(request, "activities/neighborhood.html", {
         "neighborhood": neighborhood,
         "activities": activities,
+        "cards": await cards.arender(activities),
+        "next_cursor": next_cursor,
         "time_filter": time_filter,
+        "live": live.supported(request),
     })
+    # Cards flip to "Happening now" at their start and to new day labels at midnight.
+    response.valid_until = pagecache.earliest(
+        next_change,
+        min((a.starts_at for a in activities if a.starts_at > now), default=None),
+        pagecache.next_midnight(now),
+    )
+    return response
 
 
-def activity_detail(request, pk):
-    activity = get_object_or_404(Activity, pk=pk)
+@query_budget(3)
+def neighborhood_activities(request, city_slug, neighborhood_slug):
+    """HTMX fragment: the page of activity cards after the `after` cursor."""
+    neighborhood = get_object_or_404(
+        Neighborhood.objects.select_related("city"),
+        slug=neighborhood_slug,
+        city__slug=city_slug
+    )
+    after = pagination.decode_cursor(request.GET.get("after", ""))
+    if after is None:
+        return HttpResponseBadRequest("Invalid cursor")
+    time_filter = request.GET.get("filter", "today")
+    window = Activity.Window.from_filter(time_filter)
+
+    activities, next_cursor = pagination.page(neighborhood.listings.in_window(window), after)
+    return render(request, "components/activity_list.html", {
+        "neighborhood": neighborhood,
+        "activities": activities,
+        "cards": cards.render(activities),
+        "next_cursor": next_cursor,
+        "time_filter": time_filter,
+    })
+
+
+@query_budget(1)
+async def neighborhood_events(request, city_slug, neighborhood_slug):
+    """SSE stream of helper counts for the neighborhood's activities."""
+    if not live.supported(request):
+        return HttpResponse(status=204)
+    neighborhood = await aget_object_or_404(
+        Neighborhood, slug=neighborhood_slug, city__slug=city_slug
+    )
+
+    async def snapshot():
+        return []
+
+    return live.event_stream(f"neighborhood:{neighborhood.pk}", snapshot)
 
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.create()
-        session_key = request.session.session_key
 
-    has_joined = ActivityJoin.objects.filter(
-        activity=activity,
-        session_key=session_key
-    ).exists()
+@query_budget(2)
+async def activity_events(request, pk):
+    """SSE stream of the activity's helper count and status."""
+    if not live.supported(request):
+        return HttpResponse(status=204)
+    activity = await aget_object_or_404(Activity.objects.only("pk"), pk=pk)
+
+    async def snapshot():
+        activity = await Activity.objects.filter(pk=pk).afirst()
+        return [live.event_for(activity)] if activity else []
+
+    return live.event_stream(f"activity:{pk}", snapshot)
+
+
+@query_budget(2)
+def near_me(request):
+    point = nearby.parse_point(request.GET.get("lat"), request.GET.get("lng"))
+    radius = nearby.parse_radius(request.GET.get("radius"))
+    activities = nearby.nearest(*point, radius_km=radius) if point else []
+    return render(request, "activities/nearby.html", {
+        "point": point,
+        "radius": radius,
+        "radius_choices": [1, 5, 25],
+        "results": list(zip(activities, cards.render(activities))),
+    })
+
+
+@query_budget(4)
+@conditional.acondition(
+    etag_func=conditional.activity_etag,
+    last_modified_func=conditional.activity_last_modified,
+)
+async def activity_detail(request, pk):
+    activity = await archive.aget_activity_or_404("neighborhood__city", pk=pk)
+
+    # Only joining needs a session; viewing must not create one.
+    has_joined = await sync_to_async(ledger.has_joined)(
+        request, activity.pk, join_model=activity.joins.model
+    )
 
     return render(request, "activities/detail.html", {
         "activity": activity,
         "has_joined": has_joined,
+        "live": live.supported(request),
     })
 
 
+@query_budget(16)
 @require_POST
-def activity_join(request, pk):
-    activity = get_object_or_404(Activity, pk=pk)
+async def activity_join(request, pk):
+    activity = await archive.aget_activity_or_404(pk=pk)
 
     session_key = request.session.session_key
     if not session_key:
-        request.session.create()
+        await request.session.acreate()
         session_key = request.session.session_key
 
-    join, created = ActivityJoin.objects.get_or_create(
-        activity=activity,
-        session_key=session_key
-    )
-
-    if created:
-        activity.helpers_joined += 1
-        activity.save(update_fields=["helpers_joined"])
+    # The join is a transaction, which the async ORM cannot run yet.
+    if activity.is_archived:
+        result = joining.CLOSED
+    else:
+        result = await sync_to_async(joining.join_activity)(activity.pk, session_key)
+    if result == joining.JOINED:
+        await sync_to_async(pagecache.purge)(activity.neighborhood_id, include_city=False)
+    has_joined = result in (joining.JOINED, joining.ALREADY_JOINED)
 
     if request.htmx:
-        return render(request, "components/join_button.html", {
+        response = render(request, "components/join_button.html", {
             "activity": activity,
-            "has_joined": True,
+            "has_joined": has_joined,
+            "is_full": result == joining.FULL,
         })
+    else:
+        response = redirect(activity.get_absolute_url())
 
-    return redirect(activity.get_absolute_url())
+    if has_joined:
+        await sync_to_async(ledger.record)(request, response, activity.pk)
+    return response
 
 
+@query_budget(2)
 def activity_directions(request, pk):
-    activity = get_object_or_404(Activity, pk=pk)
-    query = f"{activity.location_hint}, {activity.neighborhood.name}, {activity.neighborhood.city.name}, {activity.neighborhood.city.state}"
+    activity = ActivityListing.objects.filter(pk=pk).first()
+    if activity is None:
+        # Ended, closed or archived: look the location up the long way.
+        activity = archive.get_activity_or_404("neighborhood__city", pk=pk)
+        activity.location = f"{activity.location_hint}, {activity.neighborhood.name}, {activity.neighborhood.city.name}, {activity.neighborhood.city.state}"
+    if activity.coordinates:
+        query = "{},{}".format(*activity.coordinates)
+    else:
+        query = activity.location
     maps_url = f"https://www.google.com/maps/search/?api=1&query={query}"
     return redirect(maps_url)
 
 
+@query_budget(20)
 def activity_post(request):
     if request.method == "POST":
         form = ActivityForm(request.POST)
@@ -165,33 +227,87 @@ def activity_post(request):
     })
 
 
+@query_budget(20)
 def activity_manage(request, token):
-    activity = get_object_or_404(Activity, secret_token=token)
+    activity = archive.get_activity_or_404(secret_token=token)
 
     if request.method == "POST":
-        action = request.POST.get("action")
-
-        if action == "complete":
-            activity.status = Activity.Status.COMPLETED
-            activity.save(update_fields=["status"])
-        elif action == "cancel":
-            activity.status = Activity.Status.CANCELLED
-            activity.save(update_fields=["status"])
-        elif action == "update":
-            form = ActivityForm(request.POST, instance=activity)
-            if form.is_valid():
-                form.save()
+        with transaction.atomic():
+            # Archived activities are read-only. Locking the row keeps the
+            # archiver off it until this save commits; if the archiver got
+            # there first, the row is gone and saving would recreate it.
+            live_row = not activity.is_archived and (
+                Activity.objects.select_for_update().filter(pk=activity.pk).exists()
+            )
+            action = request.POST.get("action") if live_row else None
+
+            if action == "complete":
+                activity.status = Activity.Status.COMPLETED
+                activity.save(update_fields=["status"])
+            elif action == "cancel":
+                activity.status = Activity.Status.CANCELLED
+                activity.save(update_fields=["status"])
+            elif action == "update":
+                form = ActivityForm(request.POST, instance=activity)
+                if form.is_valid():
+                    form.save()
 
         return redirect(activity.get_manage_url())
 
-    form = ActivityForm(instance=activity)
+    form = None if activity.is_archived else ActivityForm(instance=activity)
     return render(request, "activities/manage.html", {
         "activity": activity,
         "form": form,
     })
 
 
-def search_locations(request):
+def _activity_feed(request, activities, listings):
+    """Stream the live `listings` as JSON, or every row of `activities` changed after ?since=."""
+    if "since" not in request.GET:
+        return feeds.stream(listings)
+    since = feeds.parse_since(request.GET["since"])
+    if since is None:
+        return HttpResponseBadRequest("Invalid since")
+    return feeds.stream(activities, since)
+
+
+@query_budget(1)
+async def api_activities(request):
+    """JSON feed of every activity that has not ended."""
+    now = timezone.now()
+    return _activity_feed(
+        request,
+        Activity.objects.filter(ends_at__gt=now),
+        ActivityListing.objects.filter(ends_at__gt=now),
+    )
+
+
+@query_budget(2)
+async def api_city_activities(request, city_slug):
+    city = await aget_object_or_404(City, slug=city_slug)
+    window = Activity.Window.from_filter(request.GET.get("filter", "today"))
+    return _activity_feed(
+        request,
+        Activity.objects.filter(neighborhood__city=city).in_window(window),
+        city.listings.in_window(window),
+    )
+
+
+@query_budget(2)
+async def api_neighborhood_activities(request, city_slug, neighborhood_slug):
+    neighborhood = await aget_object_or_404(
+        Neighborhood, slug=neighborhood_slug, city__slug=city_slug
+    )
+    window = Activity.Window.from_filter(request.GET.get("filter", "today"))
+    return _activity_feed(
+        request,
+        neighborhood.activities.in_window(window),
+        neighborhood.listings.in_window(window),
+    )
+
+
+@query_budget(5)
+async def search_locations(request):
     query = request.GET.get("q", "").strip()
 
     if len(query) < 2:
@@ -202,35 +318,20 @@ def search_locations(request):
             "show_empty": False,
         })
 
-    now = timezone.now()
+    cache_key = await sync_to_async(search.results_cache_key)(query)
+    content = await sync_to_async(search.get_cached_results)(cache_key)
+    if content is not None:
+        return HttpResponse(content)
 
-    cities = City.objects.filter(
-        Q(name__icontains=query) | Q(state__icontains=query)
-    ).annotate(
-        activity_count=Count(
-            "neighborhoods__activities",
-            filter=Q(
-                neighborhoods__activities__status=Activity.Status.ACTIVE,
-                neighborhoods__activities__starts_at__gte=now - timedelta(hours=2)
-            )
-        )
-    ).order_by("-activity_count", "name")[:10]
-
-    neighborhoods = Neighborhood.objects.filter(
-        name__icontains=query
-    ).select_related("city").annotate(
-        activity_count=Count(
-            "activities",
-            filter=Q(
-                activities__status=Activity.Status.ACTIVE,
-                activities__starts_at__gte=now - timedelta(hours=2)
-            )
-        )
-    ).order_by("-activity_count", "name")[:15]
+    cities, neighborhoods = await sync_to_async(search.find_locations)(query)
 
-    return render(request, "components/search_results.html", {
+    response = render(request, "components/search_results.html", {
         "query": query,
         "cities": cities,
         "neighborhoods": neighborhoods,
         "show_empty": True,
     })
+    # The empty state echoes the raw query, so only cache real results.
+    if cities or neighborhoods:
+        await sync_to_async(search.cache_results)(cache_key, response.content)
+    return response
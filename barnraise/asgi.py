@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "barnraise.settings")
 
 application = get_asgi_application()
+
+# Build the in-memory location search index as each worker starts.
+from activities.search import warm_index  # noqa: E402
+
+warm_index()
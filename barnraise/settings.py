@@ -2,10 +2,13 @@
 Django settings for barnraise project.
 """
 
+import importlib.util
+import multiprocessing
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -32,10 +35,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "activities.budget.QueryBudgetMiddleware",
+    # Outside SessionMiddleware so the session save is timed.
+    "activities.timing.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "activities.staticfiles.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    # Before CsrfViewMiddleware so a throttled request skips all view work.
+    "activities.ratelimit.RateLimitMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -47,7 +55,7 @@ ROOT_URLCONF = "barnraise.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "activities.timing.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -62,13 +70,69 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "barnraise.wsgi.application"
 
+# Each gunicorn worker (WEB_CONCURRENCY, GUNICORN_THREADS; see gunicorn.conf.py)
+# keeps its own pool, and a request holds a connection from its first query
+# to its end. A sync worker runs one request per thread. An async worker runs
+# as many as arrive, so its pool is sized to ASGI_REQUEST_CONCURRENCY, the
+# requests it is expected to have in flight at once; event streams give
+# their connection back after the first snapshot and don't count. Requests
+# beyond the pool wait up to DB_POOL_TIMEOUT for a connection, then fail.
+# DB_POOL_MAX_CONNECTIONS, if set, caps the total across workers.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", "1"))
+ASGI_WORKER = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker") != "sync"
+ASGI_REQUEST_CONCURRENCY = int(os.environ.get("ASGI_REQUEST_CONCURRENCY", "10"))
+DB_POOL_ENABLED = os.environ.get("DB_POOL_ENABLED", "True").lower() == "true"
+DB_POOL_MAX_SIZE = int(os.environ.get(
+    "DB_POOL_MAX_SIZE", ASGI_REQUEST_CONCURRENCY if ASGI_WORKER else GUNICORN_THREADS,
+))
+if os.environ.get("DB_POOL_MAX_CONNECTIONS"):
+    DB_POOL_MAX_SIZE = min(
+        DB_POOL_MAX_SIZE,
+        max(1, int(os.environ["DB_POOL_MAX_CONNECTIONS"]) // WEB_CONCURRENCY),
+    )
+# Opened per worker at start; keep it low so a deploy doesn't storm the server.
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+# Seconds a request waits for a free connection before failing.
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# Seconds between each worker's pool metrics log line.
+DB_POOL_STATS_INTERVAL = int(os.environ.get("DB_POOL_STATS_INTERVAL", "60"))
+
+# Persistent connections are per thread. Under ASGI each request's ORM calls
+# run in a thread of their own, so a kept connection is never reused and
+# only leaks a backend: close them at the end of each request unless pooled.
 DATABASES = {
     "default": dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
+        conn_max_age=0 if ASGI_WORKER else 600,
     )
 }
 
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    # Times connection checkout for Server-Timing (see activities/dbpool.py).
+    DATABASES["default"]["ENGINE"] = "activities.postgresql"
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    if DB_POOL_ENABLED and importlib.util.find_spec("psycopg_pool"):
+        # psycopg 3: a pool per worker process instead of persistent connections.
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+            "name": "barnraise",
+            "min_size": min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+            "max_idle": 300,
+            "max_lifetime": 3600,
+        }
+
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # A file-backed test database gives the concurrency tests real locking
+    # instead of the shared-cache in-memory database's "table is locked".
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+
+# Sessions exist only for visitors who join something. cached_db serves
+# session reads from the cache and only writes the database on a change.
+SESSION_ENGINE = "activities.sessions"
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -87,3 +151,90 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Emit per-phase Server-Timing headers (db, tpl, session, view, total).
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "True").lower() == "true"
+
+# Timing lines from activities.timing are logged at INFO, so they show up by
+# default in production (DEBUG off) and stay quiet in development.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "activities": {
+            "handlers": ["console"],
+            "level": os.environ.get("APP_LOG_LEVEL", "WARNING" if DEBUG else "INFO"),
+        },
+    },
+}
+
+# "log" warns when a view runs more queries than its @query_budget; "raise"
+# fails the request (the test suite uses this). QUERY_BUDGETS overrides
+# budgets by URL name, e.g. {"home": 5}.
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log")
+QUERY_BUDGETS = {}
+
+# Token-bucket limits per URL name, applied per client IP and per session
+# (see activities.ratelimit). "20/m" allows bursts of 20, refilled at 20 a minute.
+# Buckets are kept in the default cache, so set CACHE_URL for limits to hold
+# across workers rather than per worker.
+RATE_LIMITS = {
+    "search_locations": "120/m",
+    "activity_join": "20/m",
+    "activity_post": {"rate": "10/h", "methods": ["POST"]},
+} if os.environ.get("RATE_LIMIT_ENABLED", "True").lower() == "true" else {}
+# Set when behind a proxy that appends the client address to X-Forwarded-For.
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = (
+    os.environ.get("RATE_LIMIT_TRUST_X_FORWARDED_FOR", "False").lower() == "true"
+)
+
+# Pages, search results, activity cards, rate-limit buckets and tiered (L2)
+# values live in the default cache, and writes invalidate them there, so in
+# production every worker and management command must share one cache: set
+# CACHE_URL (or REDIS_URL) to redis://host:6379/0 or memcached://host:11211.
+# Unset, each process gets its own locmem cache, which only suits dev and
+# tests. Each visible card is its own entry, so locmem's default 300-entry
+# cap is too small.
+CACHE_URL = os.environ.get("CACHE_URL") or os.environ.get("REDIS_URL") or "locmem://"
+if CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        },
+    }
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_URL.removeprefix("memcached://"),
+        },
+    }
+elif CACHE_URL.startswith("locmem://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))},
+        },
+    }
+else:
+    raise ImproperlyConfigured(f"Unsupported CACHE_URL scheme: {CACHE_URL}")
+
+# Per-process LRU in front of the default cache (see activities.tiered). A
+# worker serves its own copy of a value for at most L1_TTL seconds after
+# another worker invalidates it.
+TIERED_CACHE_L1_MAX_ENTRIES = int(os.environ.get("TIERED_CACHE_L1_MAX_ENTRIES", "1000"))
+TIERED_CACHE_L1_TTL = int(os.environ.get("TIERED_CACHE_L1_TTL", "5"))
+
+# Seconds a rendered search_locations fragment may be reused.
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", "60"))
+
+# Upper bound, in seconds, on reusing a cached city or neighborhood page.
+PAGE_CACHE_MAX_AGE = int(os.environ.get("PAGE_CACHE_MAX_AGE", "300"))
+
+# Activities that ended more than this many days ago are moved to the
+# archive tables by `manage.py archive_activities`.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "barnraise.settings")
 
 application = get_wsgi_application()
+
+# Build the in-memory location search index as each worker starts.
+from activities.search import warm_index  # noqa: E402
+
+warm_index()
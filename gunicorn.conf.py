@@ -0,0 +1,18 @@
+# gunicorn settings for the Dockerfile and Procfile.
+#
+# Workers are uvicorn's ASGI worker by default, so the async views serve many
+# slow clients per process. Set GUNICORN_WORKER_CLASS=sync to fall back to
+# the WSGI application. GUNICORN_THREADS > 1 runs sync workers threaded;
+# settings.py sizes each worker's database pool from the same variables.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+
+if worker_class == "sync":
+    wsgi_app = "barnraise.wsgi:application"
+else:
+    wsgi_app = "barnraise.asgi:application"